@@ -0,0 +1,89 @@
+"""
+Compare NameIndex.best_match with the full difflib scan it replaced on a large roster.
+    
+    python benchmarks/bench_name_index.py [--names 5000] [--queries 200]
+
+Both must return the same match for every query; the script stops if they differ.
+"""
+import os
+import sys
+import time
+import random
+import difflib
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from qr_attendance.name_index import NameIndex
+
+THRESHOLD = 0.8
+WORDS = ['محمد', 'أحمد', 'عبدالله', 'سعد', 'خالد', 'فهد', 'علي', 'عمر', 'يوسف', 'ناصر', 'سلطان', 'تركي', 'بندر',
+         'فيصل', 'ماجد', 'نواف', 'عبدالرحمن', 'إبراهيم', 'صالح', 'حمد', 'مشعل', 'راشد', 'سلمان', 'عبدالعزيز',
+         'منصور', 'الحربي', 'العتيبي', 'القحطاني', 'الشهري', 'الدوسري', 'الغامدي', 'الزهراني', 'المطيري',
+         'العنزي', 'الشمري']
+LETTERS = 'ابتثجحخدذرزسشصضطظعغفقكلمنهوي'
+
+def full_scan(input_name, names):
+    """The scan _find_best_name_match did over every name before the index"""
+    input_name = ' '.join(input_name.split())
+    best_score = 0
+    best_match = None
+    for name in names:
+        name = ' '.join(str(name).split())
+        similarity = difflib.SequenceMatcher(None, input_name.lower(), name.lower()).ratio()
+        if similarity > best_score and similarity >= THRESHOLD:
+            best_score = similarity
+            best_match = name
+    return best_match, best_score
+
+def mistype(rnd, name):
+    """Up to five dropped, inserted or replaced letters"""
+    letters = list(name)
+    for _ in range(rnd.randint(0, 5)):
+        i = rnd.randrange(len(letters) + 1)
+        edit = rnd.random()
+        if edit < 0.33 and letters:
+            letters.pop(min(i, len(letters) - 1))
+        elif edit < 0.66:
+            letters.insert(i, rnd.choice(LETTERS + ' '))
+        elif letters:
+            letters[min(i, len(letters) - 1)] = rnd.choice(LETTERS)
+    return ''.join(letters)
+
+def timed(function, queries):
+    start = time.perf_counter()
+    results = [function(query) for query in queries]
+    return results, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--names', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    
+    rnd = random.Random(args.seed)
+    names = [' '.join(rnd.choice(WORDS) for _ in range(4)) for _ in range(args.names)]
+    names += ['Ali', 'bo', '', 'x y']
+    # Mostly mistyped roster names, some strangers and a few short or empty inputs
+    edge_cases = ['Alii', 'b', '', 'ali', 'x  y']
+    misses = args.queries // 5
+    queries = [mistype(rnd, rnd.choice(names)) for _ in range(args.queries - misses - len(edge_cases))]
+    queries += [' '.join(rnd.choice(WORDS) for _ in range(4)) for _ in range(misses)] + edge_cases
+    
+    expected, scan_time = timed(lambda query: full_scan(query, names), queries)
+    start = time.perf_counter()
+    index = NameIndex(names, threshold=THRESHOLD)
+    build_time = time.perf_counter() - start
+    results, index_time = timed(index.best_match, queries)
+    
+    differences = [(query, a, b) for query, a, b in zip(queries, expected, results) if a != b]
+    if differences:
+        sys.exit(f"Index and full scan differ: {differences[:5]}")
+    candidates = sum(len(index.candidates(' '.join(query.split()).lower())) for query in queries) / len(queries)
+    print(f"{len(queries)} queries on {len(names)} names, results identical")
+    print(f"full scan {1000 * scan_time / len(queries):.1f} ms/query")
+    print(f"index     {1000 * index_time / len(queries):.1f} ms/query "
+          f"(build {1000 * build_time:.0f} ms, {candidates:.0f} candidates per query)")
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
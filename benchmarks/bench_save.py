@@ -0,0 +1,72 @@
+"""
+Time ExcelHandler.save_file and its peak Python memory on a generated export.
+    
+    python benchmarks/bench_save.py [--rows 20000] [--tree PATH ...]
+
+Every --tree is another checkout to measure with the same export, e.g. the tree
+before the save rewrite from `git worktree add /tmp/before <commit>`.
+"""
+import io
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import warnings
+import contextlib
+import subprocess
+import tracemalloc
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure(tree, export, runs):
+    """Load a copy of export with the handler in tree, then time runs saves and trace one more"""
+    sys.path.insert(0, tree)
+    warnings.simplefilter('ignore')
+    from qr_attendance.excel_handler import ExcelHandler
+    
+    workbook = os.path.join(os.path.dirname(export), 'attendance.xlsx')
+    shutil.copy(export, workbook)
+    with contextlib.redirect_stdout(io.StringIO()):
+        handler = ExcelHandler(workbook)
+        handler.load_file()
+        handler.convert_date_column()
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            handler.save_file()
+            times.append(time.perf_counter() - start)
+        tracemalloc.start()
+        handler.save_file()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    print(f"{tree}: save min {min(times):.2f}s  peak {peak / 2 ** 20:.1f} MiB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--tree', action='append', default=[], help="another checkout to measure")
+    parser.add_argument('--measure', nargs=2, metavar=('TREE', 'EXPORT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.measure:
+        measure(args.measure[0], args.measure[1], args.runs)
+        return
+    
+    from fixtures import make_export
+    with tempfile.TemporaryDirectory() as directory:
+        export = os.path.join(directory, 'export.xlsx')
+        make_export(export, rows=args.rows)
+        print(f"{args.rows} rows, {args.runs} saves")
+        for tree in [REPO] + args.tree:
+            # A fresh interpreter per tree, so the trees' modules do not mix
+            with tempfile.TemporaryDirectory() as work:
+                shutil.copy(export, os.path.join(work, 'export.xlsx'))
+                subprocess.run([sys.executable, os.path.abspath(__file__), '--runs', str(args.runs),
+                                '--measure', os.path.abspath(tree), os.path.join(work, 'export.xlsx')],
+                               cwd=work, check=True)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
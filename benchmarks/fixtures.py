@@ -0,0 +1,39 @@
+import os
+import sys
+import random
+import datetime
+import openpyxl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from qr_attendance.config import COLUMN_NAMES
+
+FIRST_NAMES = ['محمد', 'أحمد', 'عبدالله', 'سعد', 'خالد', 'فهد', 'علي', 'عمر', 'يوسف', 'ناصر']
+
+def make_export(path, rows=20000, students=40, today=None, seed=1):
+    """
+    Write a portal-style attendance export with every student once per lecture day.
+    The days are centred on today so a lecture is always found for today's date.
+    """
+    today = today or datetime.date.today()
+    rnd = random.Random(seed)
+    workbook = openpyxl.Workbook()
+    worksheet = workbook.active
+    worksheet.append([COLUMN_NAMES['lecture_name'], COLUMN_NAMES['section'], 'اسم المقرر', COLUMN_NAMES['student_id'],
+                      COLUMN_NAMES['full_name'], COLUMN_NAMES['date'], COLUMN_NAMES['attendance'],
+                      COLUMN_NAMES['expected_hours'], COLUMN_NAMES['actual_hours'], COLUMN_NAMES['absence_hours'],
+                      COLUMN_NAMES['authorized_absence'], 'ملاحظات'])
+    
+    roster = [(str(444000000 + i), ' '.join(rnd.choice(FIRST_NAMES) for _ in range(4))) for i in range(students)]
+    day_count = max(1, rows // students)
+    days = [today - datetime.timedelta(days=day_count // 2 - d) for d in range(day_count)]
+    
+    written = 0
+    for day in days:
+        for student_id, name in roster:
+            if written >= rows:
+                break
+            worksheet.append(['144610', str(30000 + written % 3), 'برمجة', student_id, name,
+                              datetime.datetime(day.year, day.month, day.day), '', '2', '', '', '', None])
+            written += 1
+    workbook.save(path)
+    return roster
\ No newline at end of file
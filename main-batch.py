@@ -0,0 +1,45 @@
+import os
+import sys
+import io
+import argparse
+from datetime import datetime
+
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+try:
+    from qr_attendance.batch_processor import BATCH_OPERATIONS, find_exports, run_batch
+except ImportError:
+    from batch_processor import BATCH_OPERATIONS, find_exports, run_batch
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an attendance operation on every export in a directory")
+    parser.add_argument("directory", help="directory containing the .xlsx attendance exports")
+    parser.add_argument("operation", choices=BATCH_OPERATIONS,
+                        help="reset: clear the date's attendance, "
+                             "close: mark students without attendance absent (end-of-day closing)")
+    parser.add_argument("--date", default=datetime.now().strftime('%Y-%m-%d'),
+                        help="lecture date as YYYY-MM-DD (default: today)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (default: CPU count)")
+    args = parser.parse_args()
+    
+    if not os.path.isdir(args.directory):
+        print(f"Directory not found: {args.directory}")
+        sys.exit(2)
+    
+    file_paths = find_exports(args.directory)
+    if not file_paths:
+        print(f"No Excel exports found in {args.directory}")
+        return
+    
+    results = run_batch(file_paths, args.operation, args.date, args.workers)
+    
+    failures = [result for result in results if not result["ok"]]
+    for result in failures:
+        if result["log"]:
+            print(f"\n--- {os.path.basename(result['file'])} ---\n{result['log']}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
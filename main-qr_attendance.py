@@ -26,13 +26,19 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
 try:
     from qr_attendance.excel_handler import ExcelHandler
+    from qr_attendance.export_cache import ExportCache
+    from qr_attendance.attendance_writer import AttendanceWriter
+    from qr_attendance.attendance_store import AttendanceStore
     from qr_attendance.generate_qr import generate_lecture_qr
-    from qr_attendance.web_server import start_server
+    from qr_attendance.web_server import start_server, add_session, remove_session
     from qr_attendance.config import COLUMN_NAMES, ATTENDANCE_DURATION, QR_OUTPUT_FILENAME, OUTPUT_FILENAME
 except ImportError:
     from excel_handler import ExcelHandler
+    from export_cache import ExportCache
+    from attendance_writer import AttendanceWriter
+    from attendance_store import AttendanceStore
     from generate_qr import generate_lecture_qr
-    from web_server import start_server
+    from web_server import start_server, add_session, remove_session
     from config import COLUMN_NAMES, ATTENDANCE_DURATION, QR_OUTPUT_FILENAME, OUTPUT_FILENAME
 
 def get_local_ip():
@@ -119,21 +125,43 @@ def select_excel_file():
     
     return file_path if file_path else None
 
-def attendance_timer(excel_handler, lecture_date, attendance_duration=ATTENDANCE_DURATION, tunnel_process=None):
-    print(f"\nStarting attendance session for {attendance_duration//60} minute(s)...")
+lectures_lock = threading.Lock()
+
+def end_lecture(attendance_writer, lecture, lectures):
+    """Close one lecture's session; returns True when it was the last lecture still running"""
+    # Lectures end one at a time, so the last one only shuts down after the others are saved
+    with lectures_lock:
+        if lecture['ended']:
+            return False
+        lecture['ended'] = True
+        
+        remove_session(lecture['session_code'])
+        absent_count = attendance_writer.mark_all_absent(lecture['date'], lecture['section'])
+        print(f"{absent_count} students marked as absent in {lecture['name']}")
+        attendance_writer.end_session(lecture['date'], lecture['section'])
+        
+        success, message = attendance_writer.save_file()
+        print(message)
+        return all(other['ended'] for other in lectures)
+
+def close_attendance(excel_handler, attendance_writer):
+    attendance_writer.stop()
+    excel_handler.close_journal()
+    excel_handler.close_save_service()
+
+def attendance_timer(excel_handler, attendance_writer, lecture, lectures, attendance_duration=ATTENDANCE_DURATION, tunnel_process=None):
+    print(f"\nStarting attendance session for {lecture['name']}: {attendance_duration//60} minute(s)...")
     time.sleep(attendance_duration)
     
-    print("\n=== Attendance time expired ===")
-    absent_count = excel_handler.mark_all_absent(lecture_date)
-    print(f"{absent_count} students marked as absent")
-    
-    success, message = excel_handler.save_file()
-    print(message)
+    print(f"\n=== Attendance time expired: {lecture['name']} ===")
+    if not end_lecture(attendance_writer, lecture, lectures):
+        return
+    close_attendance(excel_handler, attendance_writer)
     
     print("\nAttendance session closed and data saved")
     
     try:
-        output_files = [os.path.abspath(OUTPUT_FILENAME), os.path.abspath(QR_OUTPUT_FILENAME)]
+        output_files = [os.path.abspath(OUTPUT_FILENAME)] + [os.path.abspath(other['qr_path']) for other in lectures]
         for file_path in output_files:
             if os.path.exists(file_path):
                 os.remove(file_path)
@@ -152,23 +180,14 @@ def attendance_timer(excel_handler, lecture_date, attendance_duration=ATTENDANCE
     time.sleep(3)
     os._exit(0)
 
-def mark_student_attendance(excel_handler, lecture_date, student_name, student_id, validate_only=False):
-    full_name_col = COLUMN_NAMES["full_name"]
-    student_id_col = COLUMN_NAMES["student_id"]
-    date_col = COLUMN_NAMES["date"]
-    
-    student_mask = (
-        (excel_handler.df[student_id_col].astype(str).str.strip() == str(student_id).strip()) &
-        (excel_handler.df[date_col].dt.date == lecture_date.date())
-    )
-    
-    if not any(student_mask):
+def mark_student_attendance(excel_handler, attendance_writer, lecture_date, student_name, student_id, validate_only=False, section=None):
+    if not excel_handler.find_student_rows(student_id, lecture_date, section):
         return False, "خطأ: الطالب غير مسجل في محاضرة اليوم"
     
     if validate_only:
         return True, "الطالب موجود في قائمة المحاضرة"
     
-    success, message = excel_handler.mark_attendance(student_name, student_id, lecture_date)
+    success, message = attendance_writer.mark_attendance(student_name, student_id, lecture_date, section)
     print(f"Web submission: {student_name} ({student_id}) - {message}")
     return success, message
 
@@ -176,6 +195,10 @@ def reset_previous_attendance_data(excel_handler, lecture_date):
     count = excel_handler.reset_attendance_for_date(lecture_date)
     print(f"Reset attendance data for {count} students for date {lecture_date.strftime('%Y-%m-%d')}")
     
+    if excel_handler.journal is not None:
+        # The reset is already journaled, the checkpointer folds it into the file
+        return count
+    
     success, message = excel_handler.save_file()
     if success:
         print("File saved successfully after resetting attendance data")
@@ -207,8 +230,8 @@ def main():
             print("No file selected. Exiting program.")
             return
         
-        excel_handler = ExcelHandler(excel_file)
-        excel_handler.load_file()
+        excel_handler = ExcelHandler(excel_file, export_cache=ExportCache(), attendance_store=AttendanceStore())
+        excel_handler.load_file(prune_columns=True)
         
         date_col = COLUMN_NAMES["date"]
         if date_col in excel_handler.df.columns:
@@ -236,63 +259,110 @@ def main():
             
             if date_col in excel_handler.df.columns:
                 try:
-                    unique_dates = sorted(excel_handler.df[date_col].dt.date.unique())
+                    unique_dates = excel_handler.get_lecture_days()
                     print(f"Available lecture dates in file: {unique_dates}")
                 except:
                     print("Could not extract unique dates")
             return
         
-        lecture_info = today_lectures.iloc[0]
-        
         lecture_name_col = COLUMN_NAMES["lecture_name"]
         section_col = COLUMN_NAMES["section"]
         date_col = COLUMN_NAMES["date"]
         
-        lecture_name = "Unknown Lecture"
-        if lecture_name_col in lecture_info.index and not pd.isnull(lecture_info[lecture_name_col]):
-            lecture_name = lecture_info[lecture_name_col]
-        elif section_col in lecture_info.index and not pd.isnull(lecture_info[section_col]):
-            lecture_name = lecture_info[section_col]
+        lecture_date = today_lectures.iloc[0][date_col]
+        
+        # Each section taught today runs as its own lecture session, sharing the loaded file
+        sections = excel_handler.get_lecture_sections(lecture_date)
+        if len(sections) < 2:
+            sections = [None]
+        
+        lectures = []
+        for index, section in enumerate(sections):
+            if section is None:
+                lecture_info = today_lectures.iloc[0]
+            else:
+                lecture_info = today_lectures[today_lectures[section_col].astype(str).str.strip() == section].iloc[0]
+            
+            lecture_name = "Unknown Lecture"
+            if lecture_name_col in lecture_info.index and not pd.isnull(lecture_info[lecture_name_col]):
+                lecture_name = lecture_info[lecture_name_col]
+            elif section_col in lecture_info.index and not pd.isnull(lecture_info[section_col]):
+                lecture_name = lecture_info[section_col]
+            if section is not None and str(lecture_name) != section:
+                lecture_name = f"{lecture_name} - {section}"
+            
+            qr_output_path = QR_OUTPUT_FILENAME
+            if section is not None:
+                qr_root, qr_ext = os.path.splitext(QR_OUTPUT_FILENAME)
+                qr_output_path = f"{qr_root}_{section}{qr_ext}"
             
-        lecture_date = lecture_info[date_col]
+            lectures.append({
+                'name': str(lecture_name),
+                'date': lecture_date,
+                'section': section,
+                'session_code': str(int(time.time()))[-8:] + (f"-{index + 1}" if section is not None else ""),
+                'qr_path': qr_output_path,
+                'ended': False
+            })
+            
+            print(f"\nLecture found for today: {lecture_name} on {lecture_date.strftime('%Y-%m-%d')}")
         
-        print(f"\nLecture found for today: {lecture_name} on {lecture_date.strftime('%Y-%m-%d')}")
+        recovered_dates = excel_handler.open_journal()
         
-        print("\n=== Resetting previous attendance data ===")
-        reset_previous_attendance_data(excel_handler, lecture_date)
+        if lecture_date.date() in recovered_dates:
+            print("\n=== Recovered attendance from an interrupted session, keeping today's data ===")
+        elif excel_handler.unclean_shutdown:
+            # Checkpointed marks are already in the file and the journal was emptied, do not reset them
+            print("\n=== Previous session did not shut down cleanly, keeping today's data ===")
+        else:
+            print("\n=== Resetting previous attendance data ===")
+            reset_previous_attendance_data(excel_handler, lecture_date)
         
         root = tk.Tk()
         root.withdraw()
         
         default_duration = ATTENDANCE_DURATION // 60
         
-        duration_minutes = simpledialog.askinteger(
-            "مدة التحضير", 
-            "أدخل مدة التحضير بالدقائق:",
-            initialvalue=default_duration,
-            minvalue=1,
-            maxvalue=120
-        )
+        for lecture in lectures:
+            prompt = "أدخل مدة التحضير بالدقائق:"
+            if len(lectures) > 1:
+                prompt = f"{prompt}\n{lecture['name']}"
+            
+            duration_minutes = simpledialog.askinteger(
+                "مدة التحضير", 
+                prompt,
+                initialvalue=default_duration,
+                minvalue=1,
+                maxvalue=120
+            )
+            
+            if duration_minutes is None:
+                duration_minutes = default_duration
+                print(f"تم استخدام مدة التحضير الافتراضية: {duration_minutes} دقيقة")
+            else:
+                print(f"تم تحديد مدة التحضير: {duration_minutes} دقيقة")
+            
+            lecture['duration'] = duration_minutes * 60
         
-        if duration_minutes is None:
-            duration_minutes = default_duration
-            print(f"تم استخدام مدة التحضير الافتراضية: {duration_minutes} دقيقة")
-        else:
-            print(f"تم تحديد مدة التحضير: {duration_minutes} دقيقة")
+        for lecture in lectures:
+            excel_handler.start_session(lecture_date, lecture['section'])
+        
+        # Built once here, then kept current as marks and absences arrive
+        excel_handler.get_absence_analytics()
         
-        custom_attendance_duration = duration_minutes * 60
+        # From here on every change to the attendance data goes through one writer thread
+        attendance_writer = AttendanceWriter(excel_handler).start()
         
-        session_code = str(int(time.time()))[-8:]
         port = 5000
         
-        server_url, _ = start_server(
-            host="0.0.0.0", 
-            port=port,
-            session_code=session_code,
-            callback=lambda name, id, validate_only=False: mark_student_attendance(
-                excel_handler, lecture_date, name, id, validate_only
+        server_url, _ = start_server(host="0.0.0.0", port=port)
+        for lecture in lectures:
+            add_session(
+                lecture['session_code'],
+                lambda name, id, validate_only=False, section=lecture['section']: mark_student_attendance(
+                    excel_handler, attendance_writer, lecture_date, name, id, validate_only, section
+                )
             )
-        )
         
         public_url, tunnel_process = create_simple_tunnel(port)
         
@@ -302,76 +372,90 @@ def main():
             msg = "يرجى التأكد من أن جميع الطلاب متصلين بنفس الشبكة المحلية."
             messagebox.showinfo("ملاحظة", msg)
         
-        qr_attendance_url = f"{public_url}/attendance?session={session_code}"
-        qr_output_path = QR_OUTPUT_FILENAME
-        _, _, _ = generate_lecture_qr(lecture_name, lecture_date, qr_attendance_url, qr_output_path)
-        
         print(f"\nWeb server started at: {server_url}")
-        print(f"Public attendance URL: {qr_attendance_url}")
-        print(f"QR code saved to: {os.path.abspath(qr_output_path)}")
         
-        try:
-            webbrowser.open(f"file://{os.path.abspath(qr_output_path)}")
-            print("\nOpened QR code image - show this to students to scan")
-        except:
-            print(f"\nCould not open QR code image automatically. Please open it manually from: {os.path.abspath(qr_output_path)}")
+        for lecture in lectures:
+            qr_attendance_url = f"{public_url}/attendance?session={lecture['session_code']}"
+            _, _, _ = generate_lecture_qr(lecture['name'], lecture_date, qr_attendance_url, lecture['qr_path'])
+            
+            print(f"Public attendance URL ({lecture['name']}): {qr_attendance_url}")
+            print(f"QR code saved to: {os.path.abspath(lecture['qr_path'])}")
+            
+            try:
+                webbrowser.open(f"file://{os.path.abspath(lecture['qr_path'])}")
+                print("\nOpened QR code image - show this to students to scan")
+            except:
+                print(f"\nCould not open QR code image automatically. Please open it manually from: {os.path.abspath(lecture['qr_path'])}")
         
-        timer_thread = threading.Thread(
-            target=attendance_timer,
-            args=(excel_handler, lecture_date, custom_attendance_duration, tunnel_process)
-        )
-        timer_thread.daemon = True
-        timer_thread.start()
+        for lecture in lectures:
+            timer_thread = threading.Thread(
+                target=attendance_timer,
+                args=(excel_handler, attendance_writer, lecture, lectures, lecture['duration'], tunnel_process)
+            )
+            timer_thread.daemon = True
+            timer_thread.start()
         
         print("\nWaiting for students to scan the QR code and register attendance...")
-        print(f"Session will automatically end after {duration_minutes} minute(s)")
+        for lecture in lectures:
+            print(f"Session for {lecture['name']} will automatically end after {lecture['duration'] // 60} minute(s)")
         print("\nNOTE: Student attendance will be rejected if there is a fingerprint mismatch")
         
         control_root = tk.Tk()
         control_root.title("QR Attendance Control")
-        control_root.geometry("400x200")
+        control_root.geometry(f"400x{120 + 110 * len(lectures)}")
         control_root.resizable(False, False)
         
-        def end_session():
-            if messagebox.askyesno("تأكيد", "هل أنت متأكد من رغبتك في إنهاء جلسة التحضير؟"):
-                excel_handler.mark_all_absent(lecture_date)
-                excel_handler.save_file()
-                
-                if tunnel_process:
-                    try:
-                        tunnel_process.terminate()
-                    except:
-                        pass
-                
-                control_root.destroy()
-                os._exit(0)
+        def close_program():
+            close_attendance(excel_handler, attendance_writer)
+            
+            if tunnel_process:
+                try:
+                    tunnel_process.terminate()
+                except:
+                    pass
+            
+            control_root.destroy()
+            os._exit(0)
         
-        label = tk.Label(control_root, text=f"جلسة التحضير: {lecture_name}", font=("Arial", 14))
-        label.pack(pady=20)
+        def end_session(lecture=None):
+            if messagebox.askyesno("تأكيد", "هل أنت متأكد من رغبتك في إنهاء جلسة التحضير؟"):
+                last = False
+                for other in lectures if lecture is None else [lecture]:
+                    last = end_lecture(attendance_writer, other, lectures) or last
+                if last:
+                    close_program()
         
         fingerprint_label = tk.Label(control_root, text="التحقق من البصمة مفعّل", font=("Arial", 10), fg="red")
         fingerprint_label.pack(pady=5)
         
-        time_label = tk.Label(control_root, text=f"الوقت المتبقي: {duration_minutes} دقيقة", font=("Arial", 12))
-        time_label.pack(pady=10)
+        for lecture in lectures:
+            label = tk.Label(control_root, text=f"جلسة التحضير: {lecture['name']}", font=("Arial", 14))
+            label.pack(pady=(15, 0))
+            
+            lecture['time_label'] = tk.Label(control_root, text=f"الوقت المتبقي: {lecture['duration'] // 60} دقيقة", font=("Arial", 12))
+            lecture['time_label'].pack(pady=5)
+            
+            if len(lectures) > 1:
+                lecture_button = tk.Button(control_root, text="إنهاء هذه المحاضرة", command=lambda lecture=lecture: end_session(lecture))
+                lecture_button.pack()
         
         end_button = tk.Button(control_root, text="إنهاء التحضير", command=end_session, bg="#ff5555", fg="white", font=("Arial", 12))
         end_button.pack(pady=20)
         
-        remaining_seconds = custom_attendance_duration
-        
-        def update_timer():
-            nonlocal remaining_seconds
-            if remaining_seconds > 0:
+        def update_timer(lecture, remaining_seconds):
+            if lecture['ended']:
+                lecture['time_label'].config(text="انتهت مدة التحضير")
+            elif remaining_seconds > 0:
                 remaining_seconds -= 1
                 minutes = remaining_seconds // 60
                 seconds = remaining_seconds % 60
-                time_label.config(text=f"الوقت المتبقي: {minutes}:{seconds:02d}")
-                control_root.after(1000, update_timer)
+                lecture['time_label'].config(text=f"الوقت المتبقي: {minutes}:{seconds:02d}")
+                control_root.after(1000, update_timer, lecture, remaining_seconds)
             else:
-                time_label.config(text="انتهت مدة التحضير")
+                lecture['time_label'].config(text="انتهت مدة التحضير")
         
-        update_timer()
+        for lecture in lectures:
+            update_timer(lecture, lecture['duration'])
         control_root.protocol("WM_DELETE_WINDOW", end_session)
         
         control_root.mainloop()
@@ -691,7 +691,7 @@ class MyTVTCApp:
                     self.remaining_time_var.set(f"الوقت المتبقي: {minutes:02d}:{seconds:02d}")
                     
                     if self.excel_handler:
-                        present_count = len(self.excel_handler.present_students)
+                        present_count = self.excel_handler.get_present_count(self.lecture_date)
                         self.present_count_var.set(str(present_count))
                 
                 time.sleep(1)
@@ -705,10 +705,15 @@ class MyTVTCApp:
         if not self.excel_handler or not self.lecture_date:
             return False, "خطأ في النظام: لم يتم تهيئة نظام التحضير بشكل صحيح"
         
+        if validate_only:
+            if not self.excel_handler.find_student_rows(student_id, self.lecture_date):
+                return False, "خطأ: الطالب غير مسجل في محاضرة اليوم"
+            return True, "الطالب موجود في قائمة المحاضرة"
+        
         result = self.excel_handler.mark_attendance(student_name, student_id, self.lecture_date)
         
         if not validate_only and result[0] and self.qr_window and self.qr_window.winfo_exists():
-            present_count = len(self.excel_handler.present_students)
+            present_count = self.excel_handler.get_present_count(self.lecture_date)
             self.present_count_var.set(str(present_count))
             
         return result
@@ -776,7 +781,7 @@ class MyTVTCApp:
         info_frame = ttk.Frame(main_frame, style='Light.TFrame')
         info_frame.pack(fill=tk.X, pady=(0, 20))
         
-        present_count = len(self.excel_handler.present_students) if self.excel_handler else 0
+        present_count = self.excel_handler.get_present_count(self.lecture_date) if self.excel_handler else 0
         
         present_text = f"تم تسجيل {present_count} طالب كحاضر"
         present_label = ttk.Label(
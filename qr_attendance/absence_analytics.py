@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+from qr_attendance.config import COLUMN_NAMES, ABSENCE_THRESHOLD_PERCENT
+
+class AbsenceAnalytics:
+    """
+    Cumulative expected, actual and absence hours of every student per course section.
+    Totals are built once with a vectorized group sum over the whole export and then
+    adjusted by the changed rows only, so marks never trigger a recomputation.
+    """
+    
+    def __init__(self, threshold_percent=ABSENCE_THRESHOLD_PERCENT):
+        self.threshold_percent = threshold_percent
+        # Group code of every DataFrame row, and the per-row hours currently counted
+        self.codes = None
+        self.actual = None
+        self.absence = None
+        self.student_ids = None
+        self.sections = None
+        self.names = None
+        self.groups_by_student = {}
+        self.total_expected = None
+        self.total_actual = None
+        self.total_absence = None
+        self.flagged = None
+    
+    @classmethod
+    def from_frame(cls, df, threshold_percent=ABSENCE_THRESHOLD_PERCENT):
+        analytics = cls(threshold_percent)
+        analytics.build(df)
+        return analytics
+    
+    def build(self, df):
+        """Compute the totals of every (student ID, section) group from the DataFrame"""
+        student_id_col = COLUMN_NAMES["student_id"]
+        if student_id_col not in df.columns:
+            raise ValueError(f"Column {student_id_col} not found in file")
+        
+        student_ids = df[student_id_col].astype(str).str.strip()
+        section_col = COLUMN_NAMES["section"]
+        if section_col in df.columns:
+            keys = pd.MultiIndex.from_arrays([student_ids, df[section_col].astype(str).str.strip()])
+        else:
+            keys = pd.MultiIndex.from_arrays([student_ids, pd.Series("", index=df.index)])
+        self.codes, groups = pd.factorize(keys)
+        self.student_ids = groups.get_level_values(0).to_numpy()
+        self.sections = groups.get_level_values(1).to_numpy()
+        
+        full_name_col = COLUMN_NAMES["full_name"]
+        first_rows = pd.Series(np.arange(len(self.codes))).groupby(self.codes).first().to_numpy()
+        if full_name_col in df.columns:
+            self.names = df[full_name_col].iloc[first_rows].astype(str).to_numpy()
+        else:
+            self.names = self.student_ids.copy()
+        self.groups_by_student = pd.Series(np.arange(len(groups))).groupby(self.student_ids).indices
+        
+        expected = self._column_hours(df, "expected_hours")
+        self.actual = self._column_hours(df, "actual_hours")
+        self.absence = self._column_hours(df, "absence_hours")
+        
+        group_count = len(groups)
+        self.total_expected = np.bincount(self.codes, weights=expected, minlength=group_count)
+        self.total_actual = np.bincount(self.codes, weights=self.actual, minlength=group_count)
+        self.total_absence = np.bincount(self.codes, weights=self.absence, minlength=group_count)
+        self.flagged = self._over_threshold(np.arange(group_count))
+    
+    def update(self, positions, actual_values, absence_values):
+        """
+        Replace the counted hours of the given DataFrame rows.
+        Returns the summaries of groups that crossed the threshold with this change.
+        """
+        positions = np.asarray(positions, dtype=np.intp)
+        if not len(positions):
+            return []
+        
+        # A row listed twice must only be counted once
+        positions, first = np.unique(positions, return_index=True)
+        actual = self.parse_hours(actual_values)[first]
+        absence = self.parse_hours(absence_values)[first]
+        codes = self.codes[positions]
+        np.add.at(self.total_actual, codes, actual - self.actual[positions])
+        np.add.at(self.total_absence, codes, absence - self.absence[positions])
+        self.actual[positions] = actual
+        self.absence[positions] = absence
+        
+        changed = np.unique(codes)
+        over = self._over_threshold(changed)
+        crossed = changed[over & ~self.flagged[changed]]
+        self.flagged[changed] = over
+        return [self._summary(group) for group in crossed]
+    
+    def absence_percent(self, groups=None):
+        """Absence hours as a percentage of expected hours (0 where nothing is expected)"""
+        if groups is None:
+            groups = slice(None)
+        expected = self.total_expected[groups]
+        absence = self.total_absence[groups]
+        return np.divide(absence * 100, expected, out=np.zeros_like(absence), where=expected > 0)
+    
+    def student_summary(self, student_id):
+        """Return one summary dict per section of a student"""
+        groups = self.groups_by_student.get(str(student_id).strip(), [])
+        return [self._summary(group) for group in groups]
+    
+    def flagged_students(self):
+        """Return the summaries of every group at or above the threshold, highest absence first"""
+        groups = np.flatnonzero(self.flagged)
+        groups = groups[np.argsort(-self.absence_percent(groups), kind='stable')]
+        return [self._summary(group) for group in groups]
+    
+    def summary_frame(self):
+        """All groups as a DataFrame, one row per student and section"""
+        return pd.DataFrame({
+            "student_id": self.student_ids,
+            "section": self.sections,
+            "student_name": self.names,
+            "expected_hours": self.total_expected,
+            "actual_hours": self.total_actual,
+            "absence_hours": self.total_absence,
+            "absence_percent": self.absence_percent(),
+            "flagged": self.flagged,
+        })
+    
+    def _over_threshold(self, groups):
+        return self.absence_percent(groups) >= self.threshold_percent
+    
+    def _summary(self, group):
+        return {
+            "student_id": self.student_ids[group],
+            "section": self.sections[group],
+            "student_name": self.names[group],
+            "expected_hours": float(self.total_expected[group]),
+            "actual_hours": float(self.total_actual[group]),
+            "absence_hours": float(self.total_absence[group]),
+            "absence_percent": float(self.absence_percent([group])[0]),
+        }
+    
+    @classmethod
+    def _column_hours(cls, df, key):
+        col_name = COLUMN_NAMES[key]
+        if col_name not in df.columns:
+            return np.zeros(len(df))
+        return cls.parse_hours(df[col_name])
+    
+    @staticmethod
+    def parse_hours(values):
+        """Hour cells are stored as text; blanks and non-numbers count as 0"""
+        values = pd.Series(np.asarray(values, dtype=object))
+        return pd.to_numeric(values, errors='coerce').fillna(0).to_numpy(dtype=np.float64)
\ No newline at end of file
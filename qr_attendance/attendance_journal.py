@@ -0,0 +1,117 @@
+import os
+import json
+import threading
+from datetime import datetime
+
+class AttendanceJournal:
+    """Append-only, fsync'd log of attendance events kept next to the Excel file"""
+    
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+        self.lock = threading.Lock()
+        self.entry_count = 0
+        self.fd = os.open(journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.size = os.fstat(self.fd).st_size
+    
+    def append(self, op, **fields):
+        """Durably record one event before the caller reports success"""
+        self.append_batch([(op, fields)])
+    
+    def append_batch(self, events):
+        """Durably record several (op, fields) events with a single sync"""
+        ts = datetime.now().isoformat()
+        data = "".join(json.dumps({"op": op, "ts": ts, **fields}, ensure_ascii=False) + "\n"
+                       for op, fields in events).encode("utf-8")
+        
+        with self.lock:
+            os.write(self.fd, data)
+            self.size += len(data)
+            # fdatasync skips the metadata flush where the platform supports it
+            if hasattr(os, "fdatasync"):
+                os.fdatasync(self.fd)
+            else:
+                os.fsync(self.fd)
+            self.entry_count += len(events)
+    
+    def read_events(self):
+        """Return the recorded events, ignoring a torn last line left by a crash"""
+        events = []
+        if not os.path.exists(self.journal_path):
+            return events
+        
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"Warning: Skipping unreadable journal entry in {self.journal_path}")
+        return events
+    
+    def mark(self):
+        """Return the current end of the journal, for a later truncate()"""
+        with self.lock:
+            return self.size, self.entry_count
+    
+    def truncate(self, mark=None):
+        """Drop the events up to mark (default: all) once they have been folded into the Excel file"""
+        with self.lock:
+            if mark is None or mark[0] >= self.size:
+                os.ftruncate(self.fd, 0)
+                os.fsync(self.fd)
+                self.size = 0
+                self.entry_count = 0
+                return
+            
+            # Keep the events appended after the mark; swap the file in atomically
+            with open(self.journal_path, "rb") as f:
+                f.seek(mark[0])
+                tail = f.read()
+            temp_path = f"{self.journal_path}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            # Windows refuses to replace a file that is still open
+            os.close(self.fd)
+            try:
+                os.replace(temp_path, self.journal_path)
+            finally:
+                # Reopened either way, a failed swap leaves the old journal in use
+                self.fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self.size = len(tail)
+            self.entry_count -= mark[1]
+    
+    def close(self):
+        with self.lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+
+class JournalCheckpointer:
+    """Background thread that periodically folds the journal into the Excel file"""
+    
+    def __init__(self, excel_handler, interval):
+        self.excel_handler = excel_handler
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+    
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.excel_handler.checkpoint()
+            except Exception as e:
+                print(f"Warning: Journal checkpoint failed: {e}")
+    
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import threading
+from qr_attendance.config import ATTENDANCE_DB_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    student_id TEXT NOT NULL,
+    section TEXT NOT NULL,
+    lecture_date TEXT NOT NULL,
+    period INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    student_name TEXT,
+    semester TEXT,
+    status TEXT,
+    expected_hours REAL,
+    actual_hours REAL,
+    absence_hours REAL,
+    authorized_absence TEXT,
+    PRIMARY KEY (student_id, section, lecture_date, period)
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_student ON attendance (student_id, lecture_date);
+CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance (lecture_date);
+CREATE INDEX IF NOT EXISTS idx_attendance_section ON attendance (section, lecture_date);
+"""
+
+HISTORY_FIELDS = ("student_id", "student_name", "lecture_date", "semester", "section", "status",
+                  "expected_hours", "actual_hours", "absence_hours", "authorized_absence")
+
+# Positions of the key fields in a (row position, period, field values...) tuple
+STUDENT_ID, LECTURE_DATE, SECTION = 2, 4, 6
+
+class AttendanceStore:
+    """
+    Local SQLite history of saved attendance, one row per student, section, lecture date and
+    period (the row's ordinal among that student's rows of the section on that date, so a
+    double-period day keeps both). Every daily export repeats the whole semester, so the same
+    lecture from another export replaces the stored row instead of being counted again.
+    Excel stays the import/export format; this answers cross-session questions.
+    """
+    
+    def __init__(self, db_path=ATTENDANCE_DB_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.lock = threading.Lock()
+        # Saves run on background threads, the lock serializes use of the connection
+        self.connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self.connection.executescript(SCHEMA)
+    
+    def record_rows(self, source, rows, replace_all=False):
+        """
+        Upsert (row position, period, field values...) tuples of one export file by student, section, date and period.
+        replace_all first drops the rows last written from this file, for a full resync.
+        """
+        source = os.path.abspath(source)
+        columns = ("source", "row", "period") + HISTORY_FIELDS
+        sql = (f"INSERT OR REPLACE INTO attendance ({', '.join(columns)}) "
+               f"VALUES ({', '.join('?' * len(columns))})")
+        with self.lock, self.connection:
+            if replace_all:
+                self.connection.execute("DELETE FROM attendance WHERE source = ?", (source,))
+            self.connection.executemany(sql, (self._keyed_row(source, row) for row in rows
+                                              if row[LECTURE_DATE] is not None))
+    
+    def absence_hours(self, student_id, semester=None):
+        """Total absence hours of a student, optionally within one semester"""
+        sql = "SELECT COALESCE(SUM(absence_hours), 0) FROM attendance WHERE student_id = ?"
+        params = [str(student_id).strip()]
+        if semester is not None:
+            sql += " AND semester = ?"
+            params.append(str(semester))
+        return self._query(sql, params)[0][0]
+    
+    def student_history(self, student_id, start_date=None, end_date=None):
+        """Return (lecture_date, section, status, absence_hours) rows of a student, oldest first"""
+        sql = "SELECT lecture_date, section, status, absence_hours FROM attendance WHERE student_id = ?"
+        params = [str(student_id).strip()]
+        if start_date is not None:
+            sql += " AND lecture_date >= ?"
+            params.append(start_date.strftime('%Y-%m-%d'))
+        if end_date is not None:
+            sql += " AND lecture_date <= ?"
+            params.append(end_date.strftime('%Y-%m-%d'))
+        return self._query(sql + " ORDER BY lecture_date", params)
+    
+    def section_summary(self, section, lecture_date):
+        """Return {status: count} of one section's lecture"""
+        rows = self._query(
+            "SELECT status, COUNT(*) FROM attendance WHERE section = ? AND lecture_date = ? GROUP BY status",
+            [str(section), lecture_date.strftime('%Y-%m-%d')]
+        )
+        return dict(rows)
+    
+    @staticmethod
+    def _keyed_row(source, row):
+        row = list(row)
+        # Rows of sections without a code share the empty section rather than a NULL key
+        if row[SECTION] is None:
+            row[SECTION] = ""
+        return [source] + row
+    
+    def _migrate(self):
+        """Rekey a database created before the period column, keyed by row position or without periods"""
+        columns = [column[1] for column in self.connection.execute("PRAGMA table_info(attendance)").fetchall()]
+        if not columns or "period" in columns:
+            return
+        
+        print("Rekeying attendance history by student, section, lecture date and period")
+        fields = ", ".join(("source", "row", "period") + HISTORY_FIELDS)
+        with self.connection:
+            # One transaction, so an interrupted migration leaves the old table in place
+            self.connection.execute("BEGIN")
+            self.connection.execute("ALTER TABLE attendance RENAME TO attendance_by_row")
+            for index in ("idx_attendance_student", "idx_attendance_date", "idx_attendance_section"):
+                self.connection.execute(f"DROP INDEX IF EXISTS {index}")
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    self.connection.execute(statement)
+            # Periods number a student's rows of a section and date within each file;
+            # later rows win, as they would have with upserts in save order
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO attendance ({fields}) "
+                f"SELECT source, row, ROW_NUMBER() OVER (PARTITION BY source, student_id, COALESCE(section, ''), "
+                f"lecture_date ORDER BY row) - 1, "
+                f"student_id, student_name, lecture_date, semester, COALESCE(section, ''), "
+                f"status, expected_hours, actual_hours, absence_hours, authorized_absence "
+                f"FROM attendance_by_row WHERE lecture_date IS NOT NULL ORDER BY rowid"
+            )
+            self.connection.execute("DROP TABLE attendance_by_row")
+    
+    def _query(self, sql, params):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+    
+    def close(self):
+        with self.lock:
+            self.connection.close()
\ No newline at end of file
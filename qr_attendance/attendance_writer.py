@@ -0,0 +1,131 @@
+import queue
+import threading
+from concurrent.futures import Future
+from qr_attendance.config import WRITER_MAX_BATCH
+
+class AttendanceWriter:
+    """
+    Single writer thread that owns every change to the attendance DataFrame.
+    Request threads enqueue operations and wait on a future for the result;
+    marks that queue up together are applied as one vectorized batch, also when
+    they belong to different lecture sessions.
+    """
+    
+    def __init__(self, excel_handler, max_batch=WRITER_MAX_BATCH):
+        self.excel_handler = excel_handler
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.thread = None
+    
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        """Apply everything already queued, then stop the writer thread"""
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+    
+    def mark_attendance(self, student_name, student_id, lecture_date, section=None):
+        return self._submit("mark", (student_name, student_id, lecture_date, section)).result()
+    
+    def mark_all_absent(self, lecture_date, section=None):
+        return self._submit("absent", (lecture_date, section)).result()
+    
+    def reset_attendance_for_date(self, lecture_date):
+        return self._submit("reset", (lecture_date,)).result()
+    
+    def end_session(self, lecture_date, section=None):
+        return self._submit("end_session", (lecture_date, section)).result()
+    
+    def save_file(self, output_path=None):
+        return self._submit("save", (output_path,)).result()
+    
+    def _submit(self, op, args):
+        if self.thread is None:
+            raise RuntimeError("Attendance writer is not running")
+        future = Future()
+        self.queue.put((op, args, future))
+        return future
+    
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            
+            # Take whatever else is already waiting, up to one batch
+            batch = [item]
+            stopping = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            self._apply(batch)
+            if stopping:
+                return
+    
+    def _apply(self, batch):
+        """Apply queued operations in arrival order, merging runs of consecutive marks"""
+        marks = []
+        for op, args, future in batch:
+            if op == "mark":
+                marks.append((args, future))
+                continue
+            
+            self._apply_marks(marks)
+            marks = []
+            if op == "save":
+                # The save service writes the file, the writer goes on applying marks
+                try:
+                    self._chain(self.excel_handler.request_save(*args), future)
+                except Exception as e:
+                    future.set_exception(e)
+            else:
+                self._resolve(future, self._operation(op), *args)
+        self._apply_marks(marks)
+    
+    def _operation(self, op):
+        return {
+            "absent": self.excel_handler.mark_all_absent,
+            "reset": self.excel_handler.reset_attendance_for_date,
+            "end_session": self.excel_handler.end_session,
+        }[op]
+    
+    def _apply_marks(self, marks):
+        if not marks:
+            return
+        try:
+            results = self.excel_handler.mark_attendance_batch([args for args, _ in marks])
+        except Exception as e:
+            for _, future in marks:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(marks, results):
+            future.set_result(result)
+    
+    @staticmethod
+    def _chain(source, future):
+        def copy_result(source):
+            if source.exception() is not None:
+                future.set_exception(source.exception())
+            else:
+                future.set_result(source.result())
+        source.add_done_callback(copy_result)
+    
+    @staticmethod
+    def _resolve(future, function, *args):
+        try:
+            future.set_result(function(*args))
+        except Exception as e:
+            future.set_exception(e)
\ No newline at end of file
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+from qr_attendance.config import BACKUP_MAX_SNAPSHOTS, BACKUP_MAX_AGE_DAYS
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl that clones a file's extents copy-on-write (btrfs, XFS, bcachefs)
+FICLONE = 0x40049409
+
+class BackupStore:
+    """
+    Bounded history of a file's previous versions, kept in <file>.backups.
+    Each distinct content is stored once under its SHA-256 and is reflinked or
+    hardlinked from the file instead of copied where the filesystem allows.
+    Hardlinks are safe because saves replace the file instead of rewriting it.
+    """
+    
+    def __init__(self, file_path, backup_dir=None, max_snapshots=BACKUP_MAX_SNAPSHOTS,
+                 max_age_days=BACKUP_MAX_AGE_DAYS):
+        self.file_path = file_path
+        self.backup_dir = backup_dir or f"{file_path}.backups"
+        self.objects_dir = os.path.join(self.backup_dir, "objects")
+        self.history_path = os.path.join(self.backup_dir, "history.json")
+        self.max_snapshots = max_snapshots
+        self.max_age_days = max_age_days
+        # File identity of the version last backed up -> its content hash
+        self.last_backup = None
+    
+    def backup(self):
+        """Record the file's current content as the newest snapshot; returns the snapshot path"""
+        if not os.path.exists(self.file_path):
+            return None
+        os.makedirs(self.objects_dir, exist_ok=True)
+        
+        # An unchanged file (same inode, size and mtime) is not hashed again
+        st = os.stat(self.file_path)
+        identity = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        if self.last_backup is not None and self.last_backup[0] == identity:
+            digest = self.last_backup[1]
+        else:
+            digest = self._hash(self.file_path)
+            self.last_backup = (identity, digest)
+        
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            method = self._store(self.file_path, object_path)
+            print(f"Backup created at: {object_path} ({method})")
+        
+        history = self._read_history()
+        if history and history[-1]["hash"] == digest:
+            # Identical content, the newest snapshot already covers it
+            history[-1]["time"] = time.time()
+        else:
+            history.append({"hash": digest, "time": time.time()})
+        self._write_history(self._prune(history))
+        return object_path
+    
+    def snapshots(self):
+        """Return [(timestamp, path)] of the kept snapshots, oldest first"""
+        return [(entry["time"], self._object_path(entry["hash"])) for entry in self._read_history()]
+    
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest + os.path.splitext(self.file_path)[1])
+    
+    @staticmethod
+    def _hash(file_path):
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def _store(self, source_path, object_path):
+        """Reflink, hardlink or copy the file into the store; returns the method used"""
+        temp_path = object_path + ".tmp"
+        try:
+            for method, store in (("reflink", self._reflink), ("hardlink", os.link), ("copy", shutil.copy2)):
+                try:
+                    store(source_path, temp_path)
+                    break
+                except OSError:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    if method == "copy":
+                        raise
+            os.replace(temp_path, object_path)
+            return method
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    @staticmethod
+    def _reflink(source_path, target_path):
+        if fcntl is None:
+            raise OSError("reflinks are not supported on this platform")
+        with open(source_path, 'rb') as source, open(target_path, 'wb') as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    
+    def _prune(self, history):
+        """Drop snapshots beyond the count and age limits (the newest is always kept)"""
+        cutoff = time.time() - self.max_age_days * 24 * 60 * 60
+        kept = [entry for entry in history[:-1] if entry["time"] >= cutoff] + history[-1:]
+        kept = kept[-self.max_snapshots:]
+        
+        referenced = {os.path.basename(self._object_path(entry["hash"])) for entry in kept}
+        for name in os.listdir(self.objects_dir):
+            if name not in referenced and not name.endswith(".tmp"):
+                try:
+                    os.remove(os.path.join(self.objects_dir, name))
+                    print(f"Removed old backup: {name}")
+                except OSError as e:
+                    print(f"Warning: Could not remove old backup {name}: {e}")
+        return kept
+    
+    def _read_history(self):
+        if not os.path.exists(self.history_path):
+            return []
+        try:
+            with open(self.history_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read backup history, starting a new one: {e}")
+            return []
+    
+    def _write_history(self, history):
+        temp_path = self.history_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(history, f)
+        os.replace(temp_path, self.history_path)
\ No newline at end of file
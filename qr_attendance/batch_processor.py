@@ -0,0 +1,87 @@
+import os
+import io
+import time
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from qr_attendance.excel_handler import ExcelHandler
+from qr_attendance.attendance_store import AttendanceStore
+
+BATCH_OPERATIONS = ("reset", "close")
+
+def find_exports(directory):
+    """Return the Excel exports in a directory, skipping Office lock files"""
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(".xlsx") and not name.startswith("~$")
+    )
+
+def process_export(file_path, operation, lecture_date):
+    """
+    Run one batch operation on one export in a worker process.
+    Returns a result dict with the affected row count, timing and any error.
+    """
+    start = time.perf_counter()
+    log = io.StringIO()
+    result = {"file": file_path, "ok": False, "count": 0, "saved": False, "error": None}
+    
+    try:
+        # Keep the handler's progress output per file instead of interleaving workers
+        with contextlib.redirect_stdout(log):
+            lecture_date = pd.Timestamp(lecture_date)
+            excel_handler = ExcelHandler(file_path, attendance_store=AttendanceStore())
+            excel_handler.load_file(prune_columns=True)
+            excel_handler.convert_date_column()
+            
+            if operation == "reset":
+                result["count"] = excel_handler.reset_attendance_for_date(lecture_date)
+            elif operation == "close":
+                result["count"] = excel_handler.mark_all_absent(lecture_date)
+            else:
+                raise ValueError(f"Unknown operation: {operation}")
+            
+            # Exports without rows for the date are left untouched
+            if result["count"]:
+                success, message = excel_handler.save_file()
+                if not success:
+                    raise RuntimeError(message)
+                result["saved"] = True
+        
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["log"] = log.getvalue()
+    
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+def run_batch(file_paths, operation, lecture_date, workers=None):
+    """Process exports in a process pool sized to the CPU count, printing each result as it finishes"""
+    if operation not in BATCH_OPERATIONS:
+        raise ValueError(f"Unknown operation: {operation}")
+    
+    workers = min(workers or os.cpu_count() or 1, max(len(file_paths), 1))
+    lecture_date = pd.Timestamp(lecture_date).strftime('%Y-%m-%d')
+    print(f"Running '{operation}' for {lecture_date} on {len(file_paths)} files with {workers} worker(s)")
+    
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(process_export, file_path, operation, lecture_date) for file_path in file_paths]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            
+            name = os.path.basename(result["file"])
+            if result["ok"]:
+                status = "saved" if result["saved"] else "unchanged"
+                print(f"  OK    {name}: {result['count']} rows, {status} ({result['seconds']:.2f}s)")
+            else:
+                print(f"  FAIL  {name}: {result['error']} ({result['seconds']:.2f}s)")
+    
+    elapsed = time.perf_counter() - start
+    failures = [result for result in results if not result["ok"]]
+    busy = sum(result["seconds"] for result in results)
+    print(f"Processed {len(results)} files in {elapsed:.2f}s ({busy:.2f}s of work), {len(failures)} failed")
+    
+    return results
\ No newline at end of file
@@ -23,6 +23,8 @@ AUTHORIZED_ABSENCE = {
 }
 
 import datetime
+import os
+import tempfile
 
 def get_qr_output_filename():
     today = datetime.datetime.now().strftime("%Y-%m-%d")
@@ -38,4 +40,98 @@ OUTPUT_FILENAME = get_output_filename()
 
 QR_OUTPUT_FILENAME = "lecture_qr.png"
 
-ATTENDANCE_DURATION = 15 * 60
\ No newline at end of file
+ATTENDANCE_DURATION = 15 * 60
+
+JOURNAL_CHECKPOINT_INTERVAL = 60
+
+EXPORT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "attendance_system", "export_cache")
+
+EXPORT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Text date formats tried in order; month-first comes before day-first like pandas' default
+DATE_FORMATS = [
+    "%m/%d/%Y",
+    "%m/%d/%Y %H:%M:%S",
+    "%d/%m/%Y",
+    "%d/%m/%Y %H:%M:%S",
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y/%m/%d",
+    "%d-%m-%Y",
+    "%d.%m.%Y",
+]
+
+DATE_FORMAT_SAMPLE_SIZE = 50
+
+# Most queued operations the attendance writer applies in one batch
+WRITER_MAX_BATCH = 256
+
+# Read-only text columns with at most this share of distinct values are loaded as categoricals
+CATEGORICAL_MAX_UNIQUE_RATIO = 0.5
+
+# Backup history kept per attendance file: at most this many snapshots, none older than the age limit
+BACKUP_MAX_SNAPSHOTS = 20
+
+BACKUP_MAX_AGE_DAYS = 30
+
+# Cross-session attendance history, fed from every save
+ATTENDANCE_DB_PATH = os.path.join(os.path.expanduser("~"), ".attendance_system", "attendance.db")
+
+# Students whose absence hours reach this share of a section's expected hours are flagged
+ABSENCE_THRESHOLD_PERCENT = 20
+
+# Web server: "pooled" serves requests from a fixed thread pool, "development" uses Flask's app.run
+SERVER_MODE = "pooled"
+
+SERVER_WORKERS = 16
+
+# Accepted connections allowed to wait for a worker; beyond this clients get an immediate 503
+SERVER_QUEUE_SIZE = 256
+
+SERVER_BACKLOG = 128
+
+# Seconds a request may take to arrive, and a kept-alive connection may stay idle
+SERVER_TIMEOUT = 10
+
+SERVER_KEEPALIVE_TIMEOUT = 2
+
+# Submissions: "async" answers with a ticket and processes in the background, "sync" answers when done
+SUBMISSION_MODE = "async"
+
+SUBMISSION_WORKERS = 4
+
+# Queued submissions allowed before new ones get a 503
+SUBMISSION_MAX_PENDING = 512
+
+# Seconds the phone waits between result polls; a poll answers at once, so no server thread waits on a ticket
+SUBMISSION_POLL_INTERVAL = 0.5
+
+# Seconds uncollected results are kept
+SUBMISSION_RESULT_TTL = 10 * 60
+
+# The form depends on the session still being open, so phones revalidate it (a 304 when unchanged)
+FORM_CACHE_CONTROL = "no-cache"
+
+CONFIRMED_CACHE_CONTROL = "public, max-age=3600"
+
+# Distinct user-agent strings whose parsed device info is kept
+USER_AGENT_CACHE_SIZE = 256
+
+# Token buckets for /submit_attendance. Students behind one campus or carrier NAT share an address,
+# so the address bucket holds a whole class with retries; the student bucket stops one student's taps
+RATE_LIMIT_CLASS_SIZE = 150
+
+RATE_LIMIT_IP_BURST = 2 * RATE_LIMIT_CLASS_SIZE
+
+RATE_LIMIT_IP_PER_SECOND = RATE_LIMIT_CLASS_SIZE / 10
+
+# ...and per (session, student ID)
+RATE_LIMIT_STUDENT_BURST = 10
+
+RATE_LIMIT_STUDENT_PER_SECOND = 0.5
+
+# Seconds a submission's first response is replayed to duplicates with the same idempotency key
+IDEMPOTENCY_WINDOW = 120
+
+# Longest a duplicate waits for the first request's response before getting a 503
+IDEMPOTENCY_WAIT_TIMEOUT = 5
\ No newline at end of file
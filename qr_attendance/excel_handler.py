@@ -1,21 +1,66 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime
+from datetime import datetime, date
 import os
-import difflib
+import functools
+import shutil
+import threading
 import openpyxl
 from openpyxl.styles import numbers
-from qr_attendance.config import COLUMN_NAMES, ATTENDANCE_STATUS, AUTHORIZED_ABSENCE
+from qr_attendance.config import (COLUMN_NAMES, ATTENDANCE_STATUS, AUTHORIZED_ABSENCE, JOURNAL_CHECKPOINT_INTERVAL,
+                                  DATE_FORMATS, DATE_FORMAT_SAMPLE_SIZE, CATEGORICAL_MAX_UNIQUE_RATIO,
+                                  ABSENCE_THRESHOLD_PERCENT)
+from qr_attendance.attendance_journal import AttendanceJournal, JournalCheckpointer
+from qr_attendance.name_index import NameIndex
+from qr_attendance.session_state import SessionState
+from qr_attendance.backup_store import BackupStore
+from qr_attendance.save_service import SaveService
+from qr_attendance.absence_analytics import AbsenceAnalytics
+
+def synchronized(method):
+    """Run an ExcelHandler method while holding the handler lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 class ExcelHandler:
-    def __init__(self, file_path=None):
+    # Day keys count days since 1970-01-01; rows without a valid date get NO_DAY
+    DAY_KEY_EPOCH = date(1970, 1, 1).toordinal()
+    NO_DAY = np.iinfo(np.int32).min
+    
+    def __init__(self, file_path=None, export_cache=None, attendance_store=None):
         self.file_path = file_path
+        self.export_cache = export_cache
+        self.attendance_store = attendance_store
+        self.workbook_loader = None
         self.df = None
-        self.present_students = set()
+        self.present_mask = None
+        # (day key, section or None) -> SessionState of each running lecture
+        self.sessions = {}
+        self.absence_analytics = None
         self.original_formats = {}
         self.attendance_col_idx = None
         self.original_workbook = None
         self.date_col_idx = None
+        self.student_index = None
+        self.name_indexes = {}
+        self.day_keys = None
+        self.day_order = None
+        self.day_ranges = {}
+        self.lecture_periods = None
+        self.dirty_cells = set()
+        self.needs_full_write = True
+        self.lock = threading.RLock()
+        self.save_lock = threading.Lock()
+        self.save_service = None
+        self.journal = None
+        self.checkpointer = None
+        # Set by open_journal when the previous run did not close its journal
+        self.unclean_shutdown = False
+        self.prune_columns = False
+        self.backup_store = None
         self.text_format_columns = {
             "attendance": None,    # مؤشر الحضور
             "expected_hours": None,  # الساعات المتوقعة
@@ -23,34 +68,122 @@ class ExcelHandler:
             "absence_hours": None,   # ساعات الغياب
         }
         
-    def load_file(self, file_path=None):
+    def load_file(self, file_path=None, prune_columns=False):
+        """
+        Load the export. With prune_columns only the COLUMN_NAMES columns are kept in the
+        DataFrame (the workbook keeps every column for saving) and repetitive read-only
+        columns are stored as categoricals.
+        """
         if file_path:
             self.file_path = file_path
         
         if not self.file_path or not os.path.exists(self.file_path):
             raise FileNotFoundError("Excel file not found")
         
-        # Load with openpyxl first to store the original format and file structure
+        self.original_workbook = None
+        self.prune_columns = prune_columns
+        
+        # An unchanged export is restored from its cached snapshot without parsing the XLSX.
+        # Snapshots are kept per requested mode and record whether pruning fell back to all columns
+        cache_variant = 'pruned' if prune_columns else ''
+        cached = self.export_cache.load(self.file_path, cache_variant) if self.export_cache else None
+        if cached is not None:
+            self.df, metadata = cached
+            self.text_format_columns.update(metadata.get('text_format_columns', {}))
+            self.date_col_idx = metadata.get('date_col_idx')
+            self.prune_columns = metadata.get('prune_columns', prune_columns)
+            # save_file still needs the workbook, load it off the startup path
+            self._start_workbook_loader()
+        else:
+            self._parse_file(cache_variant)
+        
+        self.student_index = None
+        self.name_indexes = {}
+        self.day_keys = None
+        self.day_order = None
+        self.day_ranges = {}
+        self.lecture_periods = None
+        self.sessions = {}
+        self.absence_analytics = None
+        self.dirty_cells = set()
+        self.needs_full_write = True
+        
+        # Convert necessary columns to string
+        self._convert_columns_to_string()
+        
+        # Students already saved as present stay present, so closing a day never overwrites them
+        attendance_col = COLUMN_NAMES["attendance"]
+        if attendance_col in self.df.columns:
+            self.present_mask = (self.df[attendance_col] == str(ATTENDANCE_STATUS["present"])).to_numpy()
+        else:
+            self.present_mask = np.zeros(len(self.df), dtype=bool)
+        
+        if self.prune_columns:
+            self._categorize_columns()
+            print(f"Loaded {len(self.df.columns)} columns, {self.df.memory_usage(deep=True).sum() / 1024 / 1024:.1f} MiB")
+        
+        return self.df
+    
+    def _parse_file(self, cache_variant=''):
+        """Parse the XLSX into the DataFrame and the workbook used for saving, caching it under cache_variant"""
+        # Parse the file once with openpyxl to store the original format and file structure
         try:
             self.original_workbook = openpyxl.load_workbook(self.file_path)
             self._store_column_indices()
         except Exception as e:
             print(f"Warning: Could not load original workbook with openpyxl: {e}")
         
-        # Now load with pandas for data manipulation - keep all text columns as string
+        # Now build the DataFrame for data manipulation - keep all text columns as string
         dtype_dict = {}
         for key in self.text_format_columns.keys():
             col_name = COLUMN_NAMES.get(key)
             if col_name:
                 dtype_dict[col_name] = str
         
-        # Load with specific dtypes to preserve text format
-        self.df = pd.read_excel(self.file_path, dtype=dtype_dict)
+        # Only the columns the session works with, the rest stay untouched in the workbook
+        usecols = (lambda col_name: col_name in COLUMN_NAMES.values()) if self.prune_columns else None
         
-        # Convert necessary columns to string
-        self._convert_columns_to_string()
+        # Load with specific dtypes to preserve text format, reusing the parsed workbook
+        # so the XLSX is only parsed once
+        if self.original_workbook is not None:
+            worksheet = self.original_workbook.active
+            # The workbook keeps formulas rather than their values, a sheet with formulas is read from the file
+            source = self.file_path if self._has_formulas(worksheet) else self.original_workbook
+            self.df = pd.read_excel(source, sheet_name=worksheet.title, dtype=dtype_dict, engine='openpyxl', usecols=usecols)
+            
+            # Rows that are blank in every kept column would be dropped and shift the
+            # DataFrame rows against the worksheet rows, so fall back to all columns
+            if usecols is not None and len(self.df) != worksheet.max_row - 1:
+                print("Warning: Column pruning changed the row count, loading all columns")
+                self.prune_columns = False
+                self.df = pd.read_excel(source, sheet_name=worksheet.title, dtype=dtype_dict, engine='openpyxl')
+        else:
+            self.df = pd.read_excel(self.file_path, dtype=dtype_dict, usecols=usecols)
         
-        return self.df
+        if self.export_cache and self.original_workbook is not None:
+            self.export_cache.store(self.file_path, self.df, {
+                'text_format_columns': self.text_format_columns,
+                'date_col_idx': self.date_col_idx,
+                'prune_columns': self.prune_columns
+            }, cache_variant)
+    
+    @staticmethod
+    def _has_formulas(worksheet):
+        """Whether any cell of the worksheet holds a formula"""
+        return any(cell.data_type == 'f' for row in worksheet.iter_rows() for cell in row)
+    
+    def _start_workbook_loader(self):
+        """Load the openpyxl workbook in the background after a cache hit"""
+        file_path = self.file_path
+        
+        def load():
+            try:
+                self.original_workbook = openpyxl.load_workbook(file_path)
+            except Exception as e:
+                print(f"Warning: Could not load original workbook with openpyxl: {e}")
+        
+        self.workbook_loader = threading.Thread(target=load, daemon=True)
+        self.workbook_loader.start()
     
     def _store_column_indices(self):
         """Store indices of important columns"""
@@ -93,6 +226,18 @@ class ExcelHandler:
                 except Exception as e:
                     print(f"Warning: Could not convert column '{col}': {e}")
     
+    def _categorize_columns(self):
+        """Store read-only text columns that repeat a few values as categoricals"""
+        # Columns written during a session, and the date column before it is converted
+        skip_columns = {COLUMN_NAMES[key] for key in ("date", "attendance", "actual_hours", "absence_hours", "authorized_absence")}
+        
+        for col in self.df.columns:
+            if col in skip_columns or self.df[col].dtype != object:
+                continue
+            column = self.df[col]
+            if column.nunique(dropna=False) <= CATEGORICAL_MAX_UNIQUE_RATIO * len(column):
+                self.df[col] = column.astype('category')
+    
     def convert_date_column(self, date_column=None):
         """Convert date column to datetime format"""
         if self.df is None:
@@ -112,7 +257,7 @@ class ExcelHandler:
                     print(f"Converted Excel numeric dates in '{date_column}' to datetime")
                 else:
                     # Regular date conversion for string dates
-                    self.df[date_column] = pd.to_datetime(self.df[date_column], errors='coerce')
+                    self.df[date_column] = self._parse_date_strings(self.df[date_column])
                     print(f"Converted string dates in '{date_column}' to datetime")
             except Exception as e:
                 print(f"Error during date conversion: {e}")
@@ -120,8 +265,180 @@ class ExcelHandler:
         else:
             raise ValueError(f"Column {date_column} not found in file")
         
+        self._build_day_partitions()
+        self._build_student_index()
+        
         return self.df
     
+    def _parse_date_strings(self, column):
+        """Parse a text date column once per distinct value with a detected fixed format"""
+        # Exports repeat a few lecture dates many times, so only distinct strings are parsed
+        codes, uniques = pd.factorize(column)
+        
+        date_format = self._detect_date_format(uniques)
+        if date_format is not None:
+            parsed = pd.to_datetime(uniques, format=date_format, errors='coerce')
+            # Blank cells stay NaT either way; any other miss means the format was wrong
+            blank = np.array([not value.strip() for value in uniques], dtype=bool)
+            if (parsed.isna() & ~blank).any():
+                print(f"Warning: Some dates do not match format '{date_format}', inferring instead")
+                date_format = None
+        
+        if date_format is None:
+            parsed = pd.to_datetime(uniques, errors='coerce')
+        else:
+            print(f"Detected date format '{date_format}'")
+        
+        # Missing cells have code -1 and become NaT
+        return pd.Series(parsed.take(codes, allow_fill=True, fill_value=pd.NaT),
+                         index=column.index, name=column.name)
+    
+    @staticmethod
+    def _detect_date_format(values):
+        """Return the first configured format that parses every sampled value, or None"""
+        if not all(isinstance(value, str) for value in values):
+            return None
+        
+        sample = [value for value in values if value.strip()][:DATE_FORMAT_SAMPLE_SIZE]
+        if not sample:
+            return None
+        
+        for date_format in DATE_FORMATS:
+            try:
+                pd.to_datetime(sample, format=date_format)
+                return date_format
+            except (ValueError, TypeError):
+                continue
+        return None
+    
+    def _build_day_partitions(self):
+        """Build the int32 day-key column and the day key -> row range partition map"""
+        # History periods are numbered per stored date, which the conversion changes
+        self.lecture_periods = None
+        date_col = COLUMN_NAMES["date"]
+        
+        if date_col in self.df.columns:
+            days = self.df[date_col].to_numpy().astype('datetime64[D]')
+            self.day_keys = np.where(np.isnat(days), self.NO_DAY, days.astype(np.int64)).astype(np.int32)
+        else:
+            self.day_keys = np.full(len(self.df), self.NO_DAY, dtype=np.int32)
+        
+        # Row positions grouped by day (stable, so each day keeps its row order)
+        self.day_order = np.argsort(self.day_keys, kind='stable')
+        sorted_keys = self.day_keys[self.day_order]
+        keys, starts = np.unique(sorted_keys, return_index=True)
+        stops = np.append(starts[1:], len(sorted_keys))
+        self.day_ranges = {int(key): (int(start), int(stop))
+                           for key, start, stop in zip(keys, starts, stops) if key != self.NO_DAY}
+    
+    def _day_key(self, value):
+        """Return the day key of a date or datetime"""
+        if isinstance(value, datetime):
+            value = value.date()
+        return value.toordinal() - self.DAY_KEY_EPOCH
+    
+    def _day_positions(self, day_key):
+        """Return the row positions of a lecture day, in row order"""
+        if self.day_keys is None:
+            self._build_day_partitions()
+        
+        day_range = self.day_ranges.get(day_key)
+        if day_range is None:
+            return np.empty(0, dtype=np.intp)
+        return self.day_order[day_range[0]:day_range[1]]
+    
+    def _day_mask(self, day_key):
+        """Return a boolean row mask of a lecture day"""
+        if self.day_keys is None:
+            self._build_day_partitions()
+        return self.day_keys == day_key
+    
+    def get_lecture_days(self):
+        """Return the sorted lecture dates present in the file"""
+        if self.df is None:
+            raise ValueError("Excel file must be loaded first")
+        
+        if self.day_keys is None:
+            self._build_day_partitions()
+        return [date.fromordinal(key + self.DAY_KEY_EPOCH) for key in sorted(self.day_ranges)]
+    
+    def _build_student_index(self):
+        """Build the (student_id, day key) -> row positions lookup index"""
+        student_id_col = COLUMN_NAMES["student_id"]
+        
+        self.student_index = {}
+        if student_id_col not in self.df.columns:
+            return
+        
+        if self.day_keys is None:
+            self._build_day_partitions()
+        for day_key in self.day_ranges:
+            self._index_day(day_key)
+    
+    def _refresh_student_index_for_day(self, day_key):
+        """Rebuild the index entries of a single lecture day"""
+        self.student_index = {key: positions for key, positions in self.student_index.items()
+                              if key[1] != day_key}
+        self._index_day(day_key)
+    
+    def _index_day(self, day_key):
+        student_id_col = COLUMN_NAMES["student_id"]
+        
+        positions = self._day_positions(day_key)
+        ids = self.df[student_id_col].iloc[positions].astype(str).str.strip()
+        for pos, student_id in zip(positions, ids):
+            self.student_index.setdefault((student_id, day_key), []).append(int(pos))
+    
+    def find_student_rows(self, student_id, lecture_date, section=None):
+        """
+        Return the row positions of a student on a lecture date, optionally in one
+        section (empty if not registered). A running session answers from its own roster.
+        """
+        if self.df is None:
+            raise ValueError("Excel file must be loaded first")
+        
+        student_id = str(student_id).strip()
+        day_key = self._day_key(lecture_date)
+        session = self.sessions.get((day_key, section))
+        if session is not None:
+            return session.find_positions(student_id)
+        
+        with self.lock:
+            if self.student_index is None:
+                self._build_student_index()
+            positions = self.student_index.get((student_id, day_key), [])
+            if section is not None:
+                positions = self._section_positions(positions, section).tolist()
+            return positions
+    
+    def _section_positions(self, positions, section):
+        """Keep the row positions that belong to a section (all of them for section None)"""
+        positions = np.asarray(positions, dtype=np.intp)
+        if section is None:
+            return positions
+        
+        section_col = COLUMN_NAMES["section"]
+        if section_col not in self.df.columns:
+            return positions[:0]
+        sections = self.df[section_col].iloc[positions].astype(str).str.strip().to_numpy()
+        return positions[sections == section]
+    
+    def _lecture_positions(self, day_key, section=None):
+        """Return the row positions of a lecture day, or of one section of it"""
+        return self._section_positions(self._day_positions(day_key), section)
+    
+    def get_lecture_sections(self, lecture_date):
+        """Return the sections that have rows on a lecture date, in row order"""
+        if self.df is None:
+            raise ValueError("Excel file must be loaded first")
+        
+        section_col = COLUMN_NAMES["section"]
+        if section_col not in self.df.columns:
+            return []
+        positions = self._day_positions(self._day_key(lecture_date))
+        sections = self.df[section_col].iloc[positions].dropna().astype(str).str.strip()
+        return [section for section in sections.unique() if section]
+    
     def check_lecture_today(self, date_column=None):
         """Check if there's a lecture scheduled for today"""
         if self.df is None:
@@ -141,174 +458,342 @@ class ExcelHandler:
         today = datetime.now().date()
         
         # Find lectures scheduled for today
-        today_lectures = self.df[self.df[date_column].dt.date == today]
+        if date_column == COLUMN_NAMES["date"]:
+            today_lectures = self.df.iloc[self._day_positions(self._day_key(today))]
+        else:
+            today_lectures = self.df[self.df[date_column].dt.date == today]
         
         if today_lectures.empty:
             return None
         
         return today_lectures
     
-    def _find_best_name_match(self, input_name, date_filter):
-        """Find the best matching student name for a given date"""
-        full_name_col = COLUMN_NAMES["full_name"]
-        date_col = COLUMN_NAMES["date"]
-        
-        input_name = ' '.join(input_name.split())
-        
-        today_students = self.df[self.df[date_col].dt.date == date_filter.date()]
-        if today_students.empty:
-            return None, 0
-        
-        best_score = 0
-        best_match = None
-        
-        for idx, row in today_students.iterrows():
-            db_name = row[full_name_col]
-            if not isinstance(db_name, str):
-                db_name = str(db_name)
-                
-            db_name = ' '.join(db_name.split())
-                
-            similarity = difflib.SequenceMatcher(None, input_name.lower(), db_name.lower()).ratio()
+    def _get_name_index(self, day_key, section=None):
+        """Return the name index of a lecture, building it once per session"""
+        name_index = self.name_indexes.get((day_key, section))
+        if name_index is None:
+            full_name_col = COLUMN_NAMES["full_name"]
             
-            if similarity > best_score and similarity >= 0.8:
-                best_score = similarity
-                best_match = db_name
-                
-        return best_match, best_score
+            positions = self._lecture_positions(day_key, section)
+            name_index = NameIndex(self.df[full_name_col].iloc[positions].tolist(), positions)
+            self.name_indexes[(day_key, section)] = name_index
+        return name_index
     
-    def mark_attendance(self, student_name, student_id, lecture_date):
+    def _find_best_name_match(self, input_name, date_filter, section=None):
+        """Find the best matching student name for a given date"""
+        return self._get_name_index(self._day_key(date_filter), section).best_match(input_name)
+    
+    @synchronized
+    def mark_attendance(self, student_name, student_id, lecture_date, section=None):
         """Mark a student as present"""
+        return self.mark_attendance_batch([(student_name, student_id, lecture_date, section)])[0]
+    
+    @synchronized
+    def mark_attendance_batch(self, submissions):
+        """
+        Mark a batch of (student_name, student_id, lecture_date[, section]) submissions as
+        present; without a section the whole lecture day is searched. Rows are written in
+        one vectorized update and journaled with a single sync.
+        Returns one (success, message) result per submission, in order.
+        """
         if self.df is None:
             raise ValueError("Excel file must be loaded first")
         
-        full_name_col = COLUMN_NAMES["full_name"]
-        student_id_col = COLUMN_NAMES["student_id"]
-        date_col = COLUMN_NAMES["date"]
-        attendance_col = COLUMN_NAMES["attendance"]
-        expected_hours_col = COLUMN_NAMES["expected_hours"]
-        actual_hours_col = COLUMN_NAMES["actual_hours"]
-        absence_hours_col = COLUMN_NAMES["absence_hours"]
+        results = []
+        accepted_positions = []
+        events = []
+        for student_name, student_id, lecture_date, *section in submissions:
+            section = section[0] if section else None
+            student_id = str(student_id).strip()
+            positions, result = self._verify_submission(student_name, student_id, lecture_date, section)
+            if positions is not None:
+                accepted_positions.extend(positions)
+                events.append(("mark", self._event_fields(lecture_date, section, student_id=student_id)))
+            results.append(result)
         
-        student_name = ' '.join(student_name.split())
-        student_id = str(student_id).strip()
+        if accepted_positions:
+            self._apply_present(accepted_positions)
+            self._journal_events(events)
         
-        best_name_match, match_score = self._find_best_name_match(student_name, lecture_date)
+        return results
+    
+    def _verify_submission(self, student_name, student_id, lecture_date, section=None):
+        """Check a submission against the roster; returns (row positions to mark or None, result)"""
+        student_name = ' '.join(student_name.split())
         
-        student_mask = (
-            (self.df[student_id_col].astype(str).str.strip() == student_id) &
-            (self.df[date_col].dt.date == lecture_date.date())
-        )
+        positions = self.find_student_rows(student_id, lecture_date, section)
         
-        if any(student_mask):
-            student_idx = student_mask.idxmax()
-            if isinstance(student_idx, pd.Series):
-                student_idx = student_idx.iloc[0]
-                
-            found_name = self.df.loc[student_idx, full_name_col]
-            found_name = ' '.join(str(found_name).split())
+        if len(positions):
+            # Compare against the cached normalized roster name, stopping early below 0.8
+            name_index = self._get_name_index(self._day_key(lecture_date), section)
+            found_name, similarity = name_index.match_position(positions[0], student_name)
             
             print(f"Found match by ID. Database name: {found_name}, Entered name: {student_name}")
-            similarity = difflib.SequenceMatcher(None, student_name.lower(), found_name.lower()).ratio()
-            print(f"Name similarity: {similarity:.2f}")
+            if similarity is None:
+                print("Name similarity: below 0.80")
+            else:
+                print(f"Name similarity: {similarity:.2f}")
             
-            if similarity >= 0.8:
-                # Convert all required columns to string (if needed)
-                self._convert_columns_to_string()
-                
-                # Mark as present
-                attendance_value = str(ATTENDANCE_STATUS["present"])
-                
-                for idx in self.df.index[student_mask]:
-                    # Set attendance column to "حاضر"
-                    self.df.at[idx, attendance_col] = attendance_value
-                
-                # Copy expected hours to actual hours, and clear absence hours
-                if expected_hours_col in self.df.columns and actual_hours_col in self.df.columns:
-                    for idx in self.df.index[student_mask]:
-                        expected_value = self.df.at[idx, expected_hours_col]
-                        
-                        # Set actual hours - keep as string
-                        self.df.at[idx, actual_hours_col] = expected_value
-                        
-                        # Clear absence hours
-                        if absence_hours_col in self.df.columns:
-                            self.df.at[idx, absence_hours_col] = ""
-                
-                for idx in self.df.index[student_mask]:
-                    db_name = self.df.loc[idx, full_name_col]
-                    student_key = (db_name, student_id, lecture_date.date())
-                    self.present_students.add(student_key)
-                
-                return True, "Attendance recorded successfully"
+            if similarity is not None:
+                return positions, (True, "Attendance recorded successfully")
             else:
-                return False, f"Student name doesn't match. Did you mean {found_name}? Please enter the correct name."
-        elif best_name_match and match_score >= 0.8:
-            return False, f"Student ID incorrect. Did you mean {best_name_match}? Please enter the correct ID."
+                return None, (False, f"Student name doesn't match. Did you mean {found_name}? Please enter the correct name.")
+        
+        # The name search is only needed when the ID is not registered for this lecture
+        best_name_match, match_score = self._find_best_name_match(student_name, lecture_date, section)
+        if best_name_match and match_score >= 0.8:
+            return None, (False, f"Student ID incorrect. Did you mean {best_name_match}? Please enter the correct ID.")
         else:
-            return False, "Student not registered for this lecture"
+            return None, (False, "Student not registered for this lecture")
     
-    def mark_all_absent(self, lecture_date):
-        """Mark students as absent if not present"""
+    def _apply_present(self, positions):
+        """Mark the given row positions as present"""
+        attendance_col = COLUMN_NAMES["attendance"]
+        expected_hours_col = COLUMN_NAMES["expected_hours"]
+        actual_hours_col = COLUMN_NAMES["actual_hours"]
+        absence_hours_col = COLUMN_NAMES["absence_hours"]
+        
+        positions = np.asarray(positions, dtype=np.intp)
+        
+        # Mark as present - set attendance column to "حاضر"
+        self._set_cells(positions, attendance_col, str(ATTENDANCE_STATUS["present"]))
+        
+        # Copy expected hours to actual hours (kept as string), and clear absence hours
+        if expected_hours_col in self.df.columns and actual_hours_col in self.df.columns:
+            self._set_cells(positions, actual_hours_col, self._get_cells(positions, expected_hours_col))
+            
+            if absence_hours_col in self.df.columns:
+                self._set_cells(positions, absence_hours_col, "")
+        
+        self.present_mask[positions] = True
+        self._set_session_status(positions, SessionState.PRESENT)
+        self._update_absence_analytics(positions)
+    
+    @synchronized
+    def mark_all_absent(self, lecture_date, section=None):
+        """Mark students as absent if not present, on the whole day or in one section"""
         if self.df is None:
             raise ValueError("Excel file must be loaded first")
         
-        full_name_col = COLUMN_NAMES["full_name"]
-        student_id_col = COLUMN_NAMES["student_id"]
-        date_col = COLUMN_NAMES["date"]
         attendance_col = COLUMN_NAMES["attendance"]
         expected_hours_col = COLUMN_NAMES["expected_hours"]
         actual_hours_col = COLUMN_NAMES["actual_hours"]
         absence_hours_col = COLUMN_NAMES["absence_hours"]
         authorized_absence_col = COLUMN_NAMES["authorized_absence"]
         
-        date_mask = self.df[date_col].dt.date == lecture_date.date()
-        today_indices = self.df.index[date_mask].tolist()
+        day_positions = self._lecture_positions(self._day_key(lecture_date), section)
+        absent_positions = day_positions[~self.present_mask[day_positions]]
+        
+        absent_count = len(absent_positions)
+        if not absent_count:
+            return 0
         
-        absent_indices = []
+        # Mark absent students - set attendance column to "غائب"
+        self._set_cells(absent_positions, attendance_col, str(ATTENDANCE_STATUS["absent"]))
         
-        for idx in today_indices:
-            student_name = self.df.at[idx, full_name_col]
-            student_id = self.df.at[idx, student_id_col]
-            student_key = (student_name, str(student_id), lecture_date.date())
+        # Handle hours - copy expected to absence, clear actual
+        if expected_hours_col in self.df.columns:
+            if absence_hours_col in self.df.columns:
+                self._set_cells(absent_positions, absence_hours_col, self._get_cells(absent_positions, expected_hours_col))
             
-            if student_key not in self.present_students:
-                absent_indices.append(idx)
+            if actual_hours_col in self.df.columns:
+                self._set_cells(absent_positions, actual_hours_col, "")
         
-        if not absent_indices:
-            return 0
+        # Set authorized absence to "لا"
+        if authorized_absence_col in self.df.columns:
+            self._set_cells(absent_positions, authorized_absence_col, AUTHORIZED_ABSENCE["no"])
         
-        # Convert all required columns to string (if needed)
-        self._convert_columns_to_string()
+        self._set_session_status(absent_positions, SessionState.ABSENT)
+        self._update_absence_analytics(absent_positions)
         
-        # Mark absent students
-        absent_value = str(ATTENDANCE_STATUS["absent"])
+        self._journal_event("absent", **self._event_fields(lecture_date, section))
         
-        for idx in absent_indices:
-            # Set attendance column to "غائب"
-            self.df.at[idx, attendance_col] = absent_value
-            
-            # Handle hours - copy expected to absence, clear actual
-            if expected_hours_col in self.df.columns:
-                expected_value = self.df.at[idx, expected_hours_col]
-                
-                # Set absence hours - keep as string
-                if absence_hours_col in self.df.columns:
-                    self.df.at[idx, absence_hours_col] = expected_value
-                
-                # Clear actual hours
-                if actual_hours_col in self.df.columns:
-                    self.df.at[idx, actual_hours_col] = ""
-            
-            # Set authorized absence to "لا"
-            if authorized_absence_col in self.df.columns:
-                self.df.at[idx, authorized_absence_col] = AUTHORIZED_ABSENCE["no"]
+        return absent_count
+    
+    @synchronized
+    def start_session(self, lecture_date, section=None):
+        """
+        Hold the rows of a lecture (a day, or one section of it) as compact arrays; changes
+        reach the DataFrame on save. Several lectures can run at once on separate rows.
+        Returns the session key used by end_session.
+        """
+        if self.df is None:
+            raise ValueError("Excel file must be loaded first")
+        
+        day_key = self._day_key(lecture_date)
+        for other_day, other_section in self.sessions:
+            # A whole-day session and a section session of the same day would share rows
+            if other_day == day_key and (other_section is None) != (section is None):
+                raise ValueError("A whole-day session and a section session cannot run on the same day")
+        
+        key = (day_key, section)
+        self._merge_sessions([key])
+        session = self._build_session(day_key, section)
+        if session is None:
+            self.sessions.pop(key, None)
+            return key
+        
+        self.sessions[key] = session
+        lecture = lecture_date.strftime('%Y-%m-%d') if section is None else f"section {section} on {lecture_date.strftime('%Y-%m-%d')}"
+        print(f"Attendance session holds {len(session.positions)} rows for {lecture}")
+        return key
+    
+    @synchronized
+    def end_session(self, lecture_date, section=None):
+        """Fold a lecture's session into the DataFrame and stop holding its rows"""
+        key = (self._day_key(lecture_date), section)
+        self._merge_sessions([key])
+        self.sessions.pop(key, None)
+    
+    def _build_session(self, day_key, section=None):
+        student_id_col = COLUMN_NAMES["student_id"]
+        if student_id_col not in self.df.columns or COLUMN_NAMES["attendance"] not in self.df.columns:
+            return None
+        
+        columns = [COLUMN_NAMES[key] for key in ("attendance", "expected_hours", "actual_hours", "absence_hours", "authorized_absence")
+                   if COLUMN_NAMES[key] in self.df.columns]
+        return SessionState.from_frame(self.df, self._lecture_positions(day_key, section), day_key,
+                                       student_id_col, columns, self.present_mask, section)
+    
+    def _merge_sessions(self, keys=None):
+        """Write the changed cells of the given sessions (all by default) back into the DataFrame"""
+        sessions = self.sessions.values() if keys is None else [self.sessions[key] for key in keys if key in self.sessions]
+        for session in sessions:
+            for col_name, positions, values in session.pop_changes():
+                self.df.iloc[positions, self.df.columns.get_loc(col_name)] = values
+                self._mark_dirty(positions, [col_name])
+    
+    def _split_by_session(self, positions):
+        """
+        Group row positions by the session holding them.
+        Returns [(session or None, session rows, index into positions or None for all)].
+        """
+        for session in self.sessions.values():
+            rows = session.rows_for(positions)
+            if rows is not None:
+                return [(session, rows, None)]
+        if not self.sessions:
+            return [(None, None, None)]
+        
+        # Positions spread over several sessions, or partly outside them
+        parts = []
+        remaining = np.ones(len(positions), dtype=bool)
+        for session in self.sessions.values():
+            rows, inside = session.locate(positions)
+            if inside.any():
+                parts.append((session, rows[inside], np.flatnonzero(inside)))
+                remaining &= ~inside
+        if remaining.any():
+            parts.append((None, None, np.flatnonzero(remaining)))
+        return parts
+    
+    def _set_cells(self, positions, col_name, values):
+        """Set one column at the given row positions, in the sessions holding those rows"""
+        positions = np.asarray(positions, dtype=np.intp)
+        for session, rows, index in self._split_by_session(positions):
+            part_positions = positions if index is None else positions[index]
+            part_values = values if index is None or np.ndim(values) == 0 else np.asarray(values)[index]
+            if session is not None:
+                session.set(rows, col_name, part_values)
+            else:
+                self.df.iloc[part_positions, self.df.columns.get_loc(col_name)] = part_values
+                self._mark_dirty(part_positions, [col_name])
+    
+    def _get_cells(self, positions, col_name):
+        positions = np.asarray(positions, dtype=np.intp)
+        parts = self._split_by_session(positions)
+        if len(parts) == 1 and parts[0][2] is None:
+            session, rows, _ = parts[0]
+            if session is not None:
+                return session.get(rows, col_name)
+            return self.df.iloc[positions, self.df.columns.get_loc(col_name)].to_numpy()
+        
+        values = np.empty(len(positions), dtype=object)
+        for session, rows, index in parts:
+            if session is not None:
+                values[index] = session.get(rows, col_name)
+            else:
+                values[index] = self.df.iloc[positions[index], self.df.columns.get_loc(col_name)].to_numpy()
+        return values
+    
+    def _set_session_status(self, positions, status):
+        for session, rows, _ in self._split_by_session(np.asarray(positions, dtype=np.intp)):
+            if session is not None:
+                session.set_status(rows, status)
+    
+    def _mark_dirty(self, positions, columns):
+        """Record changed (row position, column name) cells for the next save"""
+        for col_name in columns:
+            if col_name in self.df.columns:
+                self.dirty_cells.update((int(pos), col_name) for pos in positions)
+    
+    def _dirty_positions_by_column(self):
+        """Group the dirty cells as column name -> sorted row positions"""
+        positions_by_column = {}
+        for pos, col_name in self.dirty_cells:
+            positions_by_column.setdefault(col_name, []).append(pos)
+        return {col_name: sorted(positions) for col_name, positions in positions_by_column.items()}
+    
+    @synchronized
+    def get_absence_analytics(self, threshold_percent=ABSENCE_THRESHOLD_PERCENT):
+        """
+        Return the cumulative absence analytics of the loaded export, building them on first use.
+        Later marks, absences and resets update the totals of the affected rows only.
+        """
+        if self.df is None:
+            raise ValueError("Excel file must be loaded first")
+        
+        analytics = self.absence_analytics
+        if analytics is None or analytics.threshold_percent != threshold_percent:
+            analytics = AbsenceAnalytics.from_frame(self.df, threshold_percent)
+            self.absence_analytics = analytics
+            # Sessions hold changes not yet merged into the DataFrame
+            for session in self.sessions.values():
+                self._update_absence_analytics(session.positions)
+            print(f"Absence analytics: {len(analytics.flagged_students())} students at or above {threshold_percent}% absence")
+        return analytics
+    
+    def _update_absence_analytics(self, positions):
+        """Recount the hours of changed rows and report students who crossed the absence threshold"""
+        if self.absence_analytics is None or not len(positions):
+            return
+        
+        actual_hours_col = COLUMN_NAMES["actual_hours"]
+        absence_hours_col = COLUMN_NAMES["absence_hours"]
+        actual = self._get_cells(positions, actual_hours_col) if actual_hours_col in self.df.columns else np.zeros(len(positions))
+        absence = self._get_cells(positions, absence_hours_col) if absence_hours_col in self.df.columns else np.zeros(len(positions))
+        
+        for student in self.absence_analytics.update(positions, actual, absence):
+            print(f"Warning: {student['student_name']} ({student['student_id']}) reached "
+                  f"{student['absence_percent']:.1f}% absence in section {student['section']}")
+    
+    def get_present_count(self, lecture_date=None, section=None):
+        """
+        Return the number of distinct students marked present for one date (and section).
+        Without a date this counts every student present anywhere in the export, earlier saves included.
+        """
+        if self.df is None or self.present_mask is None:
+            return 0
+        
+        student_id_col = COLUMN_NAMES["student_id"]
+        if lecture_date is None:
+            return self.df[student_id_col][self.present_mask].astype(str).str.strip().nunique()
+        
+        day_key = self._day_key(lecture_date)
+        session = self.sessions.get((day_key, section))
+        if session is not None:
+            return session.present_count()
         
-        return len(absent_indices)
+        with self.lock:
+            positions = self._lecture_positions(day_key, section)
+            positions = positions[self.present_mask[positions]]
+            return self.df[student_id_col].iloc[positions].astype(str).str.strip().nunique()
     
     def save_file(self, output_path=None):
         """
-        Save Excel file while ensuring proper formatting for text columns
+        Save Excel file while ensuring proper formatting for text columns.
+        Only copying the changes into the workbook holds the handler lock; the XLSX
+        write itself runs outside it, so attendance keeps being recorded meanwhile.
         """
         if self.df is None:
             raise ValueError("Excel file must be loaded first")
@@ -316,177 +801,401 @@ class ExcelHandler:
         if output_path is None:
             output_path = self.file_path
         
+        # One save at a time, the workbook is not touched while it is being written
+        with self.save_lock:
+            return self._save_file(output_path)
+    
+    def _save_file(self, output_path):
         try:
-            # Create backup of original file
+            # Keep the previous version in the deduplicated backup history
             if os.path.exists(self.file_path):
-                backup_path = f"{self.file_path}.bak"
                 try:
-                    import shutil
-                    shutil.copy2(self.file_path, backup_path)
-                    print(f"Backup created at: {backup_path}")
+                    if self.backup_store is None or self.backup_store.file_path != self.file_path:
+                        self.backup_store = BackupStore(self.file_path)
+                    self.backup_store.backup()
                 except Exception as e:
                     print(f"Warning: Could not create backup: {e}")
             
-            # Save the DataFrame to a temporary CSV file
-            temp_csv = f"{output_path}.temp.csv"
-            self.df.to_csv(temp_csv, index=False, encoding='utf-8-sig')
-            print(f"DataFrame saved to temporary CSV: {temp_csv}")
-            
-            # Load the original Excel file with openpyxl
-            if self.original_workbook is None:
-                # If we don't have the original workbook, try to load it
-                try:
-                    self.original_workbook = openpyxl.load_workbook(self.file_path)
-                except Exception:
-                    # If that fails, create a new workbook
-                    self.original_workbook = openpyxl.Workbook()
-            
-            # Get the active worksheet
-            ws = self.original_workbook.active
-            
-            # Load the temporary CSV into a new DataFrame
-            updated_df = pd.read_csv(temp_csv, encoding='utf-8-sig')
+            # Wait for a workbook that is still loading in the background
+            if self.workbook_loader is not None:
+                self.workbook_loader.join()
+                self.workbook_loader = None
             
-            # Find headers
-            header_row = 1
-            column_indices = {}
-            
-            for idx, cell in enumerate(ws[header_row], 1):
-                if cell.value in COLUMN_NAMES.values():
-                    column_indices[cell.value] = idx
-            
-            # Get indices for special columns
-            date_idx = column_indices.get(COLUMN_NAMES['date'])
-            
-            # Map column names to their indices
-            text_column_indices = {}
-            for key, col_name in COLUMN_NAMES.items():
-                if key in self.text_format_columns and col_name in column_indices:
-                    text_column_indices[col_name] = column_indices[col_name]
-            
-            # Create mapping of all columns to their indices
-            column_mapping = {}
-            for i, col_name in enumerate(updated_df.columns):
-                if col_name in column_indices:
-                    column_mapping[i] = column_indices[col_name]
-            
-            # Update values in the worksheet
-            for row_idx, row in enumerate(updated_df.values, 2):  # Start from row 2 (skip header)
-                for col_idx, value in enumerate(row):
-                    if col_idx in column_mapping:
-                        excel_col_idx = column_mapping[col_idx]
-                        cell = ws.cell(row=row_idx, column=excel_col_idx)
-                        
-                        # Get column name
-                        col_name = updated_df.columns[col_idx]
-                        
-                        # Special handling for text format columns (attendance, hours, etc.)
-                        if col_name in text_column_indices:
-                            # Handle null/NaN values
-                            if pd.isna(value) or value == 'nan' or value is None or value == '':
-                                cell.value = ''
-                            else:
-                                # Use the value directly without any conversion
-                                cell.value = str(value)
-                            
-                            # Set number format to TEXT
-                            cell.number_format = '@'
-                        
-                        # Special handling for date column
-                        elif date_idx and excel_col_idx == date_idx:
-                            # If it's a date, format it as MM/DD/YYYY
-                            if pd.notna(value) and value != '':
-                                try:
-                                    date_value = pd.to_datetime(value)
-                                    # Store as date in Excel with custom format
-                                    cell.value = date_value
-                                    # Apply custom date format MM/DD/YYYY
-                                    cell.number_format = 'M/D/YYYY'
-                                except:
-                                    # If conversion fails, just use the value as is
-                                    cell.value = value
-                            else:
-                                cell.value = value
-                        
-                        else:
-                            # For other columns, just update the value
-                            cell.value = value
-            
-            # Ensure TEXT format for all text columns (loop through all text format columns)
-            for col_name, col_idx in text_column_indices.items():
-                if col_idx:
-                    col_letter = openpyxl.utils.get_column_letter(col_idx)
-                    for cell in ws[col_letter]:
-                        cell.number_format = '@'
-            
-            # Ensure date format for entire date column
-            if date_idx:
-                col_letter = openpyxl.utils.get_column_letter(date_idx)
-                for row_idx in range(2, len(self.df) + 2):  # Skip header
-                    cell = ws.cell(row=row_idx, column=date_idx)
-                    if isinstance(cell.value, datetime):
-                        cell.number_format = 'M/D/YYYY'
+            with self.lock:
+                # Fold the live session state into the DataFrame before writing
+                self._merge_sessions()
+                self._update_worksheet()
+                journal_mark = self._journal_mark()
+                history = self._history_snapshot(output_path)
+                self.dirty_cells.clear()
+                self.needs_full_write = False
             
             # Save the updated workbook
-            self.original_workbook.save(output_path)
-            print(f"Excel file saved with formatted columns: {output_path}")
-            
-            # Clean up temporary file
             try:
-                os.remove(temp_csv)
-            except:
-                pass
-            
-            return True, f"File saved successfully at {output_path}"
+                self._replace_file(output_path, self.original_workbook.save)
+            except Exception:
+                # The changes are still in the DataFrame, write every column next time
+                self.needs_full_write = True
+                raise
+            print(f"Excel file saved with formatted columns: {output_path}")
             
         except Exception as e:
             print(f"Error details: {str(e)}")
             import traceback
             traceback.print_exc()
             
+            # The fallback writes only the DataFrame, which lacks the pruned columns
+            if self.prune_columns:
+                return False, f"Error saving file: {e}"
+            
             # Try fallback save method
             try:
                 print("Attempting fallback save method...")
-                self.df.to_excel(output_path, index=False)
+                with self.lock:
+                    self._merge_sessions()
+                    journal_mark = self._journal_mark()
+                    self._replace_file(output_path, lambda path: self.df.to_excel(path, index=False))
                 print(f"File saved using fallback method (without formatting) at {output_path}")
+                self._truncate_journal(output_path, journal_mark)
                 return True, f"File saved using fallback method at {output_path}"
             except Exception as fallback_error:
                 print(f"Fallback save failed: {fallback_error}")
                 return False, f"Error saving file: {e}"
+        
+        # The file is written; what follows must not send a good save into the fallback
+        self._truncate_journal(output_path, journal_mark)
+        self._record_history(history)
+        
+        return True, f"File saved successfully at {output_path}"
+    
+    def _update_worksheet(self):
+        """Copy the changed (or, on the first save, all mapped) columns into the workbook"""
+        # Load the original Excel file with openpyxl
+        if self.original_workbook is None:
+            # If we don't have the original workbook, try to load it
+            try:
+                self.original_workbook = openpyxl.load_workbook(self.file_path)
+            except Exception:
+                # If that fails, create a new workbook
+                self.original_workbook = openpyxl.Workbook()
+            self.needs_full_write = True
+        
+        # Get the active worksheet
+        ws = self.original_workbook.active
+        
+        # Find headers
+        header_row = 1
+        column_indices = {}
+        
+        for idx, cell in enumerate(ws[header_row], 1):
+            if cell.value in COLUMN_NAMES.values():
+                column_indices[cell.value] = idx
+        
+        # Get indices for special columns
+        date_idx = column_indices.get(COLUMN_NAMES['date'])
+        
+        # Map column names to their indices
+        text_column_indices = {}
+        for key, col_name in COLUMN_NAMES.items():
+            if key in self.text_format_columns and col_name in column_indices:
+                text_column_indices[col_name] = column_indices[col_name]
+        
+        # The first save rewrites every mapped column, later saves only the changed cells
+        if self.needs_full_write:
+            positions_by_column = {col_name: None for col_name in self.df.columns}
+        else:
+            positions_by_column = self._dirty_positions_by_column()
+        
+        # Write the columns straight from the DataFrame
+        for col_name, positions in positions_by_column.items():
+            excel_col_idx = column_indices.get(col_name)
+            if excel_col_idx is None:
+                continue
+            
+            values, number_format = self._worksheet_column_values(
+                col_name,
+                positions,
+                is_text=col_name in text_column_indices,
+                is_date=excel_col_idx == date_idx
+            )
+            
+            if positions is None:
+                row_indices = range(2, len(values) + 2)  # Start from row 2 (skip header)
+                if number_format == '@':
+                    # TEXT format covers the header cell as well
+                    ws.cell(row=header_row, column=excel_col_idx).number_format = '@'
+            else:
+                row_indices = [pos + 2 for pos in positions]
+            
+            for row_idx, value in zip(row_indices, values):
+                cell = ws.cell(row=row_idx, column=excel_col_idx)
+                cell.value = value
+                if number_format == '@' or (number_format and isinstance(value, datetime)):
+                    cell.number_format = number_format
+    
+    def _history_snapshot(self, output_path):
+        """Collect the rows the history store needs: all of them after a full write, else the changed ones"""
+        if self.attendance_store is None or os.path.abspath(output_path) != os.path.abspath(self.file_path):
+            return None
+        
+        replace_all = self.needs_full_write
+        if replace_all:
+            positions = np.arange(len(self.df))
+        else:
+            positions = np.array(sorted({pos for pos, _ in self.dirty_cells}), dtype=np.intp)
+        if not len(positions):
+            return None
+        
+        numeric_keys = ("expected_hours", "actual_hours", "absence_hours")
+        fields = [self._lecture_periods()[positions].tolist()] + [
+            self._history_values(key, positions, numeric=key in numeric_keys)
+            for key in ("student_id", "full_name", "date", "lecture_name", "section", "attendance",
+                        "expected_hours", "actual_hours", "absence_hours", "authorized_absence")
+        ]
+        # Rows without a student ID (after the period) are not attendance records
+        rows = [(int(pos),) + values for pos, values in zip(positions, zip(*fields)) if values[1]]
+        return self.file_path, rows, replace_all
+    
+    def _history_values(self, key, positions, numeric=False):
+        """A column's values at positions as stored in the history: stripped text, ISO dates or numbers, None when missing"""
+        col_name = COLUMN_NAMES[key]
+        if col_name not in self.df.columns:
+            return [None] * len(positions)
+        values = self.df[col_name].iloc[positions]
+        if numeric:
+            values = pd.to_numeric(values, errors='coerce')
+        elif pd.api.types.is_datetime64_any_dtype(values):
+            values = values.dt.strftime('%Y-%m-%d')
+        else:
+            values = values.astype(object).where(values.isna(), values.astype(str).str.strip())
+        return values.astype(object).where(values.notna(), None).tolist()
+    
+    def _lecture_periods(self):
+        """Ordinal of every row among its student's rows of the same section and date, in file order"""
+        if self.lecture_periods is None:
+            positions = np.arange(len(self.df))
+            keys = pd.DataFrame({key: self._history_values(key, positions) for key in ("student_id", "section", "date")})
+            # The store keys a missing section as ''
+            keys["section"] = keys["section"].fillna("")
+            self.lecture_periods = keys.groupby(list(keys.columns), sort=False, dropna=False).cumcount().to_numpy()
+        return self.lecture_periods
+    
+    def _record_history(self, history):
+        if history is None:
+            return
+        source, rows, replace_all = history
+        try:
+            self.attendance_store.record_rows(source, rows, replace_all)
+        except Exception as e:
+            print(f"Warning: Could not update attendance history: {e}")
     
+    @staticmethod
+    def _replace_file(output_path, write):
+        """Write through a temporary file renamed over output_path, so snapshots linked to the old file stay intact"""
+        root, ext = os.path.splitext(output_path)
+        temp_path = f"{root}.{os.getpid()}.tmp{ext}"
+        try:
+            write(temp_path)
+            with open(temp_path, 'rb+') as f:
+                os.fsync(f.fileno())
+            if os.path.exists(output_path):
+                shutil.copymode(output_path, temp_path)
+            os.replace(temp_path, output_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def _worksheet_column_values(self, col_name, positions=None, is_text=False, is_date=False):
+        """Return a DataFrame column (or some of its rows) as worksheet-ready values and the number format to apply"""
+        column = self.df[col_name]
+        if positions is not None:
+            column = column.iloc[positions]
+        missing = column.isna().to_numpy()
+        
+        if is_text:
+            # Text columns are written as strings, with missing values left empty
+            values = column.astype(str).to_numpy(dtype=object)
+            values[missing] = ''
+            values[values == 'nan'] = ''
+            return values.tolist(), '@'
+        
+        values = column.astype(object).to_numpy()
+        values[missing] = None
+        
+        if is_date:
+            # Dates are stored as real dates in Excel with the M/D/YYYY format
+            if not pd.api.types.is_datetime64_any_dtype(column):
+                values = [self._to_excel_date(value) for value in values]
+            return list(values), 'M/D/YYYY'
+        
+        return [value.item() if isinstance(value, np.generic) else value for value in values], None
+    
+    @staticmethod
+    def _to_excel_date(value):
+        if value is None or value == '':
+            return value
+        try:
+            return pd.to_datetime(value)
+        except Exception:
+            # If conversion fails, just use the value as is
+            return value
+    
+    @synchronized
     def reset_attendance_for_date(self, lecture_date):
         """Reset attendance data for a specific date"""
         if self.df is None:
             raise ValueError("Excel file must be loaded first")
         
-        date_col = COLUMN_NAMES["date"]
-        attendance_col = COLUMN_NAMES["attendance"]
-        absence_hours_col = COLUMN_NAMES["absence_hours"]
-        authorized_absence_col = COLUMN_NAMES["authorized_absence"]
-        actual_hours_col = COLUMN_NAMES["actual_hours"]
-        
-        date_mask = self.df[date_col].dt.date == lecture_date.date()
-        date_indices = self.df.index[date_mask].tolist()
+        day_key = self._day_key(lecture_date)
+        date_mask = self._day_mask(day_key)
+        date_count = int(date_mask.sum())
         
-        if not date_indices:
+        if not date_count:
             return 0
         
-        for idx in date_indices:
-            # Clear all attendance-related columns
-            if attendance_col in self.df.columns:
-                self.df.at[idx, attendance_col] = ""
+        session_keys = [key for key in self.sessions if key[0] == day_key]
+        self._merge_sessions(session_keys)
+        
+        # Clear all attendance-related columns
+        reset_columns = [COLUMN_NAMES[key] for key in ("attendance", "absence_hours", "authorized_absence", "actual_hours")
+                         if COLUMN_NAMES[key] in self.df.columns]
+        if reset_columns:
+            self.df.loc[date_mask, reset_columns] = ""
+            self._mark_dirty(np.flatnonzero(date_mask), reset_columns)
+        
+        # Keep the lookup indexes in sync with the rows of this date
+        if self.student_index is not None:
+            self._refresh_student_index_for_day(day_key)
+        self.name_indexes = {key: name_index for key, name_index in self.name_indexes.items() if key[0] != day_key}
+        
+        # Clear present rows for this date
+        self.present_mask[date_mask] = False
+        for key in session_keys:
+            self.sessions[key] = self._build_session(*key)
+        self._update_absence_analytics(np.flatnonzero(date_mask))
+        
+        self._journal_event("reset", date=lecture_date.strftime('%Y-%m-%d'))
+        
+        return date_count
+
+    def open_journal(self, journal_path=None, checkpoint_interval=JOURNAL_CHECKPOINT_INTERVAL):
+        """
+        Replay any journal left by an interrupted session, then keep journaling new events.
+        Returns the lecture dates that had events replayed. A leftover journal sets
+        unclean_shutdown even when empty: a checkpoint saved its marks and truncated it.
+        """
+        if self.df is None:
+            raise ValueError("Excel file must be loaded first")
+        
+        if journal_path is None:
+            journal_path = f"{self.file_path}.journal"
+        
+        with self.lock:
+            # close_journal removes the journal, so finding one means the last run ended abruptly
+            self.unclean_shutdown = os.path.exists(journal_path)
+            journal = AttendanceJournal(journal_path)
+            events = journal.read_events()
             
-            if absence_hours_col in self.df.columns:
-                self.df.at[idx, absence_hours_col] = ""
+            recovered_dates = set()
+            for event in events:
+                try:
+                    lecture_date = pd.Timestamp(event["date"])
+                    section = event.get("section")
+                    if event["op"] == "mark":
+                        self._apply_present(self.find_student_rows(event["student_id"], lecture_date, section))
+                    elif event["op"] == "absent":
+                        self.mark_all_absent(lecture_date, section)
+                    elif event["op"] == "reset":
+                        self.reset_attendance_for_date(lecture_date)
+                    recovered_dates.add(lecture_date.date())
+                except Exception as e:
+                    print(f"Warning: Could not replay journal event {event}: {e}")
             
-            if authorized_absence_col in self.df.columns:
-                self.df.at[idx, authorized_absence_col] = ""
-
-            if actual_hours_col in self.df.columns:
-                self.df.at[idx, actual_hours_col] = ""
+            if events:
+                print(f"Replayed {len(events)} attendance events from journal: {journal_path}")
+            
+            # Attach only after replay so replayed events are not journaled twice
+            journal.entry_count = len(events)
+            self.journal = journal
+        
+        if checkpoint_interval:
+            self.checkpointer = JournalCheckpointer(self, checkpoint_interval)
+            self.checkpointer.start()
         
-        # Clear present students set for this date
-        self.present_students = {key for key in self.present_students 
-                               if key[2] != lecture_date.date()}
+        return sorted(recovered_dates)
+    
+    def checkpoint(self):
+        """Fold pending journal events into the Excel file"""
+        with self.lock:
+            if self.journal is None or not self.journal.entry_count:
+                return False
+        success, _ = self.request_save().result()
+        return success
+    
+    def request_save(self, output_path=None):
+        """
+        Queue a background save and return a Future of its (success, message) result.
+        Requests made while a save is running share one follow-up save.
+        """
+        if self.df is None:
+            raise ValueError("Excel file must be loaded first")
+        
+        with self.lock:
+            if self.save_service is None:
+                self.save_service = SaveService(self)
+                self.save_service.start()
+            return self.save_service.request(output_path)
+    
+    def close_save_service(self):
+        """Finish the queued background saves and stop the save thread"""
+        with self.lock:
+            save_service, self.save_service = self.save_service, None
+        if save_service is not None:
+            save_service.stop()
+    
+    def close_journal(self):
+        """Stop checkpointing and close the journal, removing it if nothing is pending"""
+        if self.checkpointer is not None:
+            self.checkpointer.stop()
+            self.checkpointer = None
         
-        return len(date_indices)
\ No newline at end of file
+        with self.lock:
+            if self.journal is None:
+                return
+            self.journal.close()
+            if not self.journal.entry_count:
+                try:
+                    os.remove(self.journal.journal_path)
+                except OSError:
+                    pass
+            self.journal = None
+    
+    @staticmethod
+    def _event_fields(lecture_date, section=None, **fields):
+        """Journal fields of a lecture; whole-day events keep the format without a section"""
+        fields["date"] = lecture_date.strftime('%Y-%m-%d')
+        if section is not None:
+            fields["section"] = section
+        return fields
+    
+    def _journal_event(self, op, **fields):
+        if self.journal is not None:
+            self.journal.append(op, **fields)
+    
+    def _journal_events(self, events):
+        if self.journal is not None:
+            self.journal.append_batch(events)
+    
+    def _journal_mark(self):
+        return self.journal.mark() if self.journal is not None else None
+    
+    def _truncate_journal(self, output_path, journal_mark):
+        # Events are folded only when the journaled file itself was written, and only
+        # those recorded before the save copied the data (later ones stay journaled)
+        if self.journal is not None and journal_mark is not None and \
+                os.path.abspath(output_path) == os.path.abspath(self.file_path):
+            try:
+                self.journal.truncate(journal_mark)
+            except Exception as e:
+                # The saved events stay journaled; replaying them onto the saved file changes nothing
+                print(f"Warning: Could not truncate the attendance journal: {e}")
@@ -0,0 +1,131 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+from qr_attendance.config import EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_BYTES
+
+class ExportCache:
+    """
+    Local snapshot cache of parsed attendance exports.
+    Each snapshot is a directory of typed, memory-mappable .npy column files
+    keyed by the export's content hash and mtime.
+    """
+    
+    def __init__(self, cache_dir=EXPORT_CACHE_DIR, max_bytes=EXPORT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+    
+    def _snapshot_key(self, file_path, variant=''):
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        key = f"{digest.hexdigest()[:32]}_{os.stat(file_path).st_mtime_ns}"
+        # Different load modes of the same export are cached separately
+        return f"{key}_{variant}" if variant else key
+    
+    def load(self, file_path, variant=''):
+        """Return (DataFrame, metadata) for an unchanged export, or None on a cache miss"""
+        try:
+            snapshot_dir = os.path.join(self.cache_dir, self._snapshot_key(file_path, variant))
+            meta_path = os.path.join(snapshot_dir, 'meta.json')
+            if not os.path.exists(meta_path):
+                return None
+            
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            
+            columns = {}
+            for i, column in enumerate(meta['columns']):
+                # Copy-on-write mapping: pages are read lazily and edits never reach the cache
+                values = np.load(os.path.join(snapshot_dir, f"c{i}.npy"), mmap_mode='c')
+                if column['kind'] == 'text':
+                    nulls = np.load(os.path.join(snapshot_dir, f"c{i}.null.npy"))
+                    values = values.astype(object)
+                    values[nulls] = np.nan
+                columns[column['name']] = pd.Series(values, copy=False).astype(column['dtype'], copy=False)
+            
+            df = pd.DataFrame(columns, columns=[column['name'] for column in meta['columns']])
+            
+            # Touch the snapshot so eviction removes the least recently used first
+            os.utime(meta_path)
+            print(f"Loaded cached snapshot of {file_path}")
+            return df, meta['extra']
+        except Exception as e:
+            print(f"Warning: Could not read export cache, parsing the file instead: {e}")
+            return None
+    
+    def store(self, file_path, df, extra=None, variant=''):
+        """Write a snapshot of a freshly parsed export; unsupported column types skip caching"""
+        try:
+            snapshot_dir = os.path.join(self.cache_dir, self._snapshot_key(file_path, variant))
+            if os.path.exists(snapshot_dir):
+                return True
+            
+            temp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp_')
+            try:
+                columns = []
+                for i, name in enumerate(df.columns):
+                    column = df[name]
+                    kind = self._write_column(temp_dir, i, column)
+                    if kind is None:
+                        print(f"Export cache skipped: column '{name}' has mixed value types")
+                        return False
+                    columns.append({'name': name, 'kind': kind, 'dtype': str(column.dtype)})
+                
+                with open(os.path.join(temp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                    json.dump({'columns': columns, 'extra': extra or {}}, f, ensure_ascii=False)
+                
+                os.rename(temp_dir, snapshot_dir)
+            finally:
+                if os.path.exists(temp_dir):
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+            
+            self._evict()
+            return True
+        except Exception as e:
+            print(f"Warning: Could not write export cache: {e}")
+            return False
+    
+    def _write_column(self, snapshot_dir, i, column):
+        values_path = os.path.join(snapshot_dir, f"c{i}.npy")
+        
+        if column.dtype != object and not pd.api.types.is_string_dtype(column.dtype):
+            # Numeric, boolean and datetime columns are stored with their native dtype
+            np.save(values_path, column.to_numpy())
+            return 'native'
+        
+        nulls = column.isna().to_numpy()
+        present = column[~nulls]
+        if not all(isinstance(value, str) for value in present):
+            return None
+        
+        # Text is stored as a fixed-width unicode array so it stays memory-mappable
+        values = np.where(nulls, '', column.to_numpy(dtype=object)).astype(str)
+        np.save(values_path, values)
+        np.save(os.path.join(snapshot_dir, f"c{i}.null.npy"), nulls)
+        return 'text'
+    
+    def _evict(self):
+        """Remove the least recently used snapshots until the cache fits its size cap"""
+        snapshots = []
+        total_size = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_dir() or entry.name.startswith('.'):
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+            meta_path = os.path.join(entry.path, 'meta.json')
+            last_used = os.stat(meta_path).st_mtime if os.path.exists(meta_path) else 0
+            snapshots.append((last_used, size, entry.path))
+            total_size += size
+        
+        for last_used, size, path in sorted(snapshots):
+            if total_size <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total_size -= size
+            print(f"Evicted cached snapshot: {path}")
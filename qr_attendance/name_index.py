@@ -0,0 +1,104 @@
+from collections import Counter
+import numpy as np
+from qr_attendance.name_similarity import NameForm, NameSimilarity
+
+class NameIndex:
+    """
+    Character n-gram count index over one lecture's roster names.
+    
+    A query is only scored against rows that can still reach the similarity
+    threshold. SequenceMatcher.ratio() is 2*M/T where M (matched characters)
+    never exceeds the characters both names have in common, nor their longest
+    common subsequence. So ratio >= threshold needs:
+      - at least threshold*T/2 shared characters (1-gram counts), and
+      - at most d = (1 - threshold)*T inserted/deleted characters. Each such edit
+        destroys at most 2 of a name's 2-grams, so the names must share at least
+        max(len(query), len(name)) - 1 - 2*d 2-grams.
+    Rows failing either bound are pruned without changing the result.
+    """
+    
+    # Slack for floating point error, it can only keep extra candidates
+    EPSILON = 1e-9
+    
+    def __init__(self, names, positions=None, threshold=0.8):
+        self.threshold = threshold
+        self.similarity = NameSimilarity(threshold)
+        # Cached normalized forms of the roster names, in roster order
+        self.forms = [NameForm(name) for name in names]
+        self.keys = [form.key for form in self.forms]
+        # DataFrame row position -> index row
+        if positions is None:
+            positions = range(len(self.forms))
+        self.row_by_position = {int(pos): row for row, pos in enumerate(positions)}
+        self.lengths = np.array([len(key) for key in self.keys], dtype=np.int32)
+        
+        self.char_columns, self.char_counts = self._count_matrix([Counter(key) for key in self.keys])
+        self.bigram_columns, self.bigram_counts = self._count_matrix([self._bigrams(key) for key in self.keys])
+    
+    @staticmethod
+    def _bigrams(text):
+        return Counter(text[i:i + 2] for i in range(len(text) - 1))
+    
+    @staticmethod
+    def _count_matrix(row_counters):
+        """Build a rows x n-grams count matrix and the n-gram -> column mapping"""
+        columns = {}
+        for counter in row_counters:
+            for gram in counter:
+                columns.setdefault(gram, len(columns))
+        
+        matrix = np.zeros((len(row_counters), max(len(columns), 1)), dtype=np.int16)
+        for row, counter in enumerate(row_counters):
+            for gram, count in counter.items():
+                matrix[row, columns[gram]] = count
+        return columns, matrix
+    
+    @staticmethod
+    def _shared_counts(query_counter, columns, matrix):
+        """Per row, the size of the multiset intersection with the query's n-grams"""
+        known = [(columns[gram], count) for gram, count in query_counter.items() if gram in columns]
+        if not known:
+            return np.zeros(matrix.shape[0], dtype=np.int64)
+        cols, counts = zip(*known)
+        return np.minimum(matrix[:, list(cols)], np.array(counts)).sum(axis=1)
+    
+    def candidates(self, query_key):
+        """Return the rows that may score at least the threshold, in roster order"""
+        if not self.keys:
+            return []
+        
+        total_lengths = self.lengths + len(query_key)
+        
+        shared_chars = self._shared_counts(Counter(query_key), self.char_columns, self.char_counts)
+        keep = 2 * shared_chars >= self.threshold * total_lengths - self.EPSILON
+        
+        max_edits = np.floor((1 - self.threshold) * total_lengths + self.EPSILON)
+        required_bigrams = np.maximum(self.lengths, len(query_key)) - 1 - 2 * max_edits
+        shared_bigrams = self._shared_counts(self._bigrams(query_key), self.bigram_columns, self.bigram_counts)
+        keep &= shared_bigrams >= required_bigrams
+        
+        return np.flatnonzero(keep).tolist()
+    
+    def best_match(self, input_name):
+        """Return (best matching name, score) or (None, 0), same as a full scan"""
+        query_form = NameForm(input_name)
+        
+        best_score = 0
+        best_match = None
+        
+        for row in self.candidates(query_form.key):
+            similarity = self.similarity.score(query_form, self.forms[row])
+            
+            if similarity is not None and similarity > best_score:
+                best_score = similarity
+                best_match = self.forms[row].name
+        
+        return best_match, best_score
+    
+    def match_position(self, position, input_name):
+        """
+        Compare the input with the roster name at a DataFrame row position.
+        Returns (roster name, similarity) where similarity is None below the threshold.
+        """
+        name_form = self.forms[self.row_by_position[int(position)]]
+        return name_form.name, self.similarity.score(NameForm(input_name), name_form)
@@ -0,0 +1,58 @@
+import difflib
+
+def normalize_name(name):
+    """Collapse runs of whitespace the same way the roster and the form input are compared"""
+    return ' '.join(str(name).split())
+
+class NameForm:
+    """Normalized name plus everything the similarity bounds need, computed once"""
+    __slots__ = ('name', 'key', 'char_counts', 'matcher')
+    
+    def __init__(self, name):
+        self.name = normalize_name(name)
+        self.key = self.name.lower()
+        self.char_counts = {}
+        for char in self.key:
+            self.char_counts[char] = self.char_counts.get(char, 0) + 1
+        # Built on first use; a roster name is always the second sequence so its lookup tables are reused
+        self.matcher = None
+
+class NameSimilarity:
+    """
+    Threshold-aware name similarity with the same decisions as
+    difflib.SequenceMatcher(None, query, name).ratio() >= threshold.
+    
+    Cheap upper bounds reject early: the length ratio (real_quick_ratio) and the
+    shared character multiset (quick_ratio). Identical names are accepted without
+    matching. The full ratio is only computed for names that pass both bounds.
+    """
+    
+    def __init__(self, threshold=0.8):
+        self.threshold = threshold
+    
+    def score(self, query_form, name_form):
+        """Return the exact ratio when it reaches the threshold, otherwise None"""
+        if query_form.key == name_form.key:
+            return 1.0
+        
+        query_length = len(query_form.key)
+        name_length = len(name_form.key)
+        total_length = query_length + name_length
+        
+        # Length bound, as in SequenceMatcher.real_quick_ratio()
+        if 2.0 * min(query_length, name_length) / total_length < self.threshold:
+            return None
+        
+        # Shared character multiset bound, as in SequenceMatcher.quick_ratio()
+        shared = 0
+        for char, count in query_form.char_counts.items():
+            shared += min(count, name_form.char_counts.get(char, 0))
+        if 2.0 * shared / total_length < self.threshold:
+            return None
+        
+        if name_form.matcher is None:
+            name_form.matcher = difflib.SequenceMatcher(None, '', name_form.key)
+        matcher = name_form.matcher
+        matcher.set_seq1(query_form.key)
+        similarity = matcher.ratio()
+        return similarity if similarity >= self.threshold else None
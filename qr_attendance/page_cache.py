@@ -0,0 +1,42 @@
+import gzip
+import hashlib
+from flask import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+class CompressedPage:
+    """
+    An HTML page rendered once and kept with its gzip and (when available) brotli encodings.
+    Each encoding has its own strong ETag, so a 304 only confirms the exact bytes the client holds.
+    """
+    
+    def __init__(self, html, cache_control):
+        self.cache_control = cache_control
+        body = html.encode('utf-8')
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.variants = {'identity': (body, digest)}
+        # Compressed once at full level, mtime fixed so the bytes (and ETag) are reproducible
+        self.variants['gzip'] = (gzip.compress(body, compresslevel=9, mtime=0), f"{digest}-gzip")
+        if brotli is not None:
+            self.variants['br'] = (brotli.compress(body, quality=11), f"{digest}-br")
+        # Server preference when the client accepts several encodings equally
+        self.encodings = [encoding for encoding in ('br', 'gzip', 'identity') if encoding in self.variants]
+    
+    def response(self, request):
+        """Serve the best encoding the client accepts, or 304 when its cached copy is current"""
+        encoding = request.accept_encodings.best_match(self.encodings, default='identity')
+        body, etag = self.variants[encoding]
+        
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype='text/html')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['ETag'] = f'"{etag}"'
+        response.headers['Cache-Control'] = self.cache_control
+        return response
\ No newline at end of file
@@ -0,0 +1,56 @@
+import threading
+from concurrent.futures import Future
+
+class SaveService:
+    """
+    Background thread that writes the Excel file for ExcelHandler.request_save.
+    Save requests made while a write is running are coalesced into one follow-up
+    write, so callers never wait on XLSX serialization unless they ask for the result.
+    """
+    
+    def __init__(self, excel_handler):
+        self.excel_handler = excel_handler
+        self.condition = threading.Condition()
+        # Output path -> future of the next write to it
+        self.pending = {}
+        self.stopping = False
+        self.thread = None
+    
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def request(self, output_path=None):
+        with self.condition:
+            if self.stopping:
+                raise RuntimeError("Save service is shut down")
+            future = self.pending.get(output_path)
+            if future is None:
+                future = Future()
+                self.pending[output_path] = future
+                self.condition.notify()
+            return future
+    
+    def stop(self):
+        """Write everything still requested, then stop the save thread"""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+    
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopping:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                output_path, future = next(iter(self.pending.items()))
+                del self.pending[output_path]
+            
+            try:
+                future.set_result(self.excel_handler.save_file(output_path))
+            except Exception as e:
+                future.set_exception(e)
\ No newline at end of file
@@ -0,0 +1,93 @@
+import threading
+import numpy as np
+
+class SessionState:
+    """
+    Compact live state of one lecture (a day, or one section of it) while attendance
+    is being taken. Holds only that lecture's rows as NumPy arrays; changed cells are
+    merged back into the DataFrame in one pass when the file is saved. Its own lock and
+    roster lookup let each lecture be read without waiting on the others.
+    """
+    __slots__ = ('day_key', 'section', 'positions', 'ids', 'rows_by_id', 'status', 'columns', 'values', 'dirty', 'lock')
+    
+    UNMARKED = 0
+    PRESENT = 1
+    ABSENT = 2
+    
+    def __init__(self, day_key, positions, ids, columns, values, status=None, section=None):
+        self.day_key = day_key
+        self.section = section
+        # DataFrame row positions of the lecture, ascending
+        self.positions = np.asarray(positions, dtype=np.intp)
+        self.ids = np.asarray(ids, dtype=str)
+        self.rows_by_id = {}
+        for row, student_id in enumerate(self.ids):
+            self.rows_by_id.setdefault(student_id, []).append(row)
+        self.status = np.zeros(len(self.positions), dtype=np.int8) if status is None else status
+        # Column name -> index into values and the columns of the dirty matrix
+        self.columns = {col_name: i for i, col_name in enumerate(columns)}
+        self.values = values
+        self.dirty = np.zeros((len(self.positions), len(self.columns)), dtype=bool)
+        self.lock = threading.Lock()
+    
+    @classmethod
+    def from_frame(cls, df, positions, day_key, id_col, columns, present_mask=None, section=None):
+        """Materialize the given rows and columns of the DataFrame"""
+        positions = np.asarray(positions, dtype=np.intp)
+        ids = df[id_col].iloc[positions].astype(str).str.strip().to_numpy()
+        values = [df[col_name].iloc[positions].to_numpy(dtype=object, copy=True) for col_name in columns]
+        
+        status = None
+        if present_mask is not None:
+            status = np.where(present_mask[positions], cls.PRESENT, cls.UNMARKED).astype(np.int8)
+        return cls(day_key, positions, ids, columns, values, status, section)
+    
+    def rows_for(self, positions):
+        """Map DataFrame row positions to session rows, or None if any is outside the session"""
+        rows, inside = self.locate(positions)
+        if not inside.all():
+            return None
+        return rows
+    
+    def locate(self, positions):
+        """Return (session rows, mask of the positions this session holds)"""
+        positions = np.asarray(positions, dtype=np.intp)
+        rows = np.searchsorted(self.positions, positions)
+        inside = rows < len(self.positions)
+        inside[inside] = self.positions[rows[inside]] == positions[inside]
+        return rows, inside
+    
+    def find_positions(self, student_id):
+        """Return the DataFrame row positions of a student in this lecture"""
+        rows = self.rows_by_id.get(student_id, [])
+        return self.positions[rows].tolist()
+    
+    def get(self, rows, col_name):
+        with self.lock:
+            return self.values[self.columns[col_name]][rows]
+    
+    def set(self, rows, col_name, values):
+        column = self.columns[col_name]
+        with self.lock:
+            self.values[column][rows] = values
+            self.dirty[rows, column] = True
+    
+    def set_status(self, rows, status):
+        with self.lock:
+            self.status[rows] = status
+    
+    def present_count(self):
+        """Number of distinct student IDs marked present"""
+        with self.lock:
+            return len(np.unique(self.ids[self.status == self.PRESENT]))
+    
+    def pop_changes(self):
+        """Return [(column name, DataFrame positions, values)] of changed cells and clear them"""
+        changes = []
+        with self.lock:
+            for col_name, column in self.columns.items():
+                rows = np.flatnonzero(self.dirty[:, column])
+                if len(rows):
+                    changes.append((col_name, self.positions[rows], self.values[column][rows]))
+            self.dirty[:] = False
+        return changes
\ No newline at end of file
@@ -0,0 +1,83 @@
+import time
+import threading
+from collections import OrderedDict
+
+class RateLimiter:
+    """
+    Token buckets per client key: each key may burst up to capacity requests
+    and regains rate tokens per second. Only the most recently used max_keys
+    buckets are kept; a dropped bucket simply starts full again.
+    """
+    
+    def __init__(self, capacity, rate, max_keys=10000):
+        self.capacity = capacity
+        self.rate = rate
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        # Key -> [tokens, time of the last refill]
+        self.buckets = OrderedDict()
+    
+    def allow(self, key):
+        """Take a token for key; returns (allowed, seconds until the next token)"""
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = [self.capacity, now]
+                self.buckets[key] = bucket
+                if len(self.buckets) > self.max_keys:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+                bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True, 0
+            return False, (1 - bucket[0]) / self.rate
+
+class IdempotencyCache:
+    """
+    First response of every idempotency key seen within the window.
+    A duplicate gets that response, waiting for it if the first request is still running.
+    """
+    
+    def __init__(self, window):
+        self.window = window
+        self.lock = threading.Lock()
+        # Key -> {'event', 'response', 'expires'}, oldest first
+        self.entries = OrderedDict()
+    
+    def claim(self, key):
+        """Return (entry, True) for the first request with this key and (entry, False) for a duplicate"""
+        now = time.monotonic()
+        with self.lock:
+            while self.entries:
+                oldest = next(iter(self.entries.values()))
+                if oldest['expires'] > now:
+                    break
+                self.entries.popitem(last=False)
+            
+            entry = self.entries.get(key)
+            if entry is not None:
+                return entry, False
+            entry = {'event': threading.Event(), 'response': None, 'expires': now + self.window}
+            self.entries[key] = entry
+            return entry, True
+    
+    def complete(self, key, entry, response, keep=True):
+        """Publish the first request's response; keep=False forgets the key so a retry runs again"""
+        if not keep:
+            with self.lock:
+                if self.entries.get(key) is entry:
+                    del self.entries[key]
+        else:
+            entry['response'] = response
+        entry['event'].set()
+    
+    @staticmethod
+    def wait(entry, timeout):
+        """The first request's response, or None if it was not kept or did not finish in time"""
+        entry['event'].wait(timeout)
+        return entry['response']
\ No newline at end of file
@@ -0,0 +1,95 @@
+import time
+import queue
+import secrets
+import threading
+from qr_attendance.config import SUBMISSION_WORKERS, SUBMISSION_MAX_PENDING, SUBMISSION_RESULT_TTL
+
+class SubmissionQueue:
+    """
+    Accept-then-process queue for attendance submissions.
+    The request thread enqueues a job and answers with a ticket at once; a few
+    background threads run the jobs and the client picks the result up by ticket.
+    """
+    
+    def __init__(self, workers=SUBMISSION_WORKERS, max_pending=SUBMISSION_MAX_PENDING, result_ttl=SUBMISSION_RESULT_TTL):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        # Ticket -> {'result', 'finished_at'}
+        self.tickets = {}
+        self.pending = 0
+        self.threads = []
+    
+    def start(self):
+        # Threads are started up front, starting one inside a request would stall it under load
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"attendance-submit-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+    
+    def stop(self):
+        """Process everything already queued, then stop the worker threads"""
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+    
+    def submit(self, function, *args):
+        """
+        Queue function(*args), which must return a (payload, status_code) pair.
+        Returns the ticket, or None when too many submissions are already waiting.
+        """
+        if not self.threads:
+            raise RuntimeError("Submission queue is not running")
+        ticket = secrets.token_urlsafe(16)
+        entry = {'result': None, 'finished_at': None}
+        with self.lock:
+            if self.pending >= self.max_pending:
+                return None
+            self.pending += 1
+            self.tickets[ticket] = entry
+        
+        self.queue.put((entry, function, args))
+        return ticket
+    
+    def result(self, ticket):
+        """
+        A ticket's (payload, status_code), without waiting.
+        Returns None while it is still processing; raises KeyError for unknown or expired tickets.
+        """
+        entry = self.tickets[ticket]
+        # finished_at is set after the result, so a finished entry always has its result
+        if entry['finished_at'] is None:
+            return None
+        return entry['result']
+    
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            
+            entry, function, args = item
+            try:
+                result = function(*args)
+            except Exception as e:
+                print(f"Error processing submission: {e}")
+                result = ({'status': 'error', 'message': 'حدث خطأ أثناء تسجيل الحضور'}, 500)
+            
+            entry['result'] = result
+            entry['finished_at'] = time.monotonic()
+            with self.lock:
+                self.pending -= 1
+                self._expire()
+    
+    def _expire(self):
+        # Results nobody collected are dropped after the TTL; called with the lock held
+        cutoff = time.monotonic() - self.result_ttl
+        expired = [ticket for ticket, entry in self.tickets.items()
+                   if entry['finished_at'] is not None and entry['finished_at'] < cutoff]
+        for ticket in expired:
+            del self.tickets[ticket]
\ No newline at end of file
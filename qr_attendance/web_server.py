@@ -4,18 +4,67 @@ import socket
 import os
 import json
 import re
+import math
+import hashlib
+import ipaddress
+from functools import lru_cache
 from datetime import datetime
 from security.fingerprint import DeviceFingerprint
+from qr_attendance.config import (SERVER_MODE, SUBMISSION_MODE, SUBMISSION_POLL_INTERVAL, FORM_CACHE_CONTROL,
+                                  CONFIRMED_CACHE_CONTROL, USER_AGENT_CACHE_SIZE, RATE_LIMIT_IP_BURST,
+                                  RATE_LIMIT_IP_PER_SECOND, RATE_LIMIT_STUDENT_BURST, RATE_LIMIT_STUDENT_PER_SECOND,
+                                  IDEMPOTENCY_WINDOW, IDEMPOTENCY_WAIT_TIMEOUT)
+from qr_attendance.wsgi_server import PooledWSGIServer
+from qr_attendance.submission_queue import SubmissionQueue
+from qr_attendance.page_cache import CompressedPage
+from qr_attendance.submission_guard import RateLimiter, IdempotencyCache
 
 app = Flask(__name__, template_folder=os.path.join(os.path.dirname(__file__), 'templates'))
 
 attendance_data = {
-    'session_code': None,
-    'callback_function': None,
-    'students': [],
-    'fingerprint_failures': {}  # Para registrar fallos de verificación por estudiante
+    'sessions': {},  # Session code -> state of one running lecture, see add_session
+    'lock': threading.Lock(),
+    'server_thread': None,
+    'fingerprint': None,
+    'fingerprint_lock': threading.Lock(),
+    'submissions': None,
+    'confirmed_page': None,
+    'address_limiter': RateLimiter(RATE_LIMIT_IP_BURST, RATE_LIMIT_IP_PER_SECOND),
+    'student_limiter': RateLimiter(RATE_LIMIT_STUDENT_BURST, RATE_LIMIT_STUDENT_PER_SECOND),
+    'idempotency': IdempotencyCache(IDEMPOTENCY_WINDOW)
 }
 
+def add_session(session_code, callback):
+    """Accept submissions for one more lecture; each session has its own roster callback and lock"""
+    # The form only differs by session code, so it is rendered and compressed once here
+    form_page = render_page('attendance_form.html', FORM_CACHE_CONTROL, session_code=session_code)
+    with attendance_data['lock']:
+        attendance_data['sessions'][session_code] = {
+            'callback_function': callback,
+            'form_page': form_page,
+            'students': [],
+            'fingerprint_failures': {},  # Para registrar fallos de verificación por estudiante
+            'lock': threading.Lock()
+        }
+
+def remove_session(session_code):
+    with attendance_data['lock']:
+        attendance_data['sessions'].pop(session_code, None)
+
+def get_session(session_code):
+    return attendance_data['sessions'].get(session_code)
+
+def render_page(template_name, cache_control, **context):
+    with app.app_context():
+        return CompressedPage(render_template(template_name, **context), cache_control)
+
+def verify_fingerprint(student_name, request):
+    """Fingerprint checks read and rewrite one JSON file, so concurrent requests take turns"""
+    with attendance_data['fingerprint_lock']:
+        if attendance_data['fingerprint'] is None:
+            attendance_data['fingerprint'] = DeviceFingerprint()
+        return attendance_data['fingerprint'].verify_student(student_name, request)
+
 def get_local_ip():
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -26,8 +75,14 @@ def get_local_ip():
     except:
         return socket.gethostbyname(socket.gethostname())
 
-def get_client_device_info(request):
-    user_agent = request.user_agent.string
+ANDROID_VERSION = re.compile(r'Android\s([0-9\.]+)')
+IOS_VERSION = re.compile(r'OS\s([0-9_]+)')
+WINDOWS_VERSION = re.compile(r'Windows NT\s([0-9\.]+)')
+MAC_VERSION = re.compile(r'Mac OS X\s([0-9_\.]+)')
+
+@lru_cache(maxsize=USER_AGENT_CACHE_SIZE)
+def parse_user_agent(user_agent):
+    """Device type, browser and OS of a user-agent string; a class only sends a few distinct ones"""
     device_info = {}
     
     if 'Mobile' in user_agent:
@@ -52,17 +107,17 @@ def get_client_device_info(request):
     
     if 'Android' in user_agent:
         device_info['os'] = 'أندرويد'
-        version_match = re.search(r'Android\s([0-9\.]+)', user_agent)
+        version_match = ANDROID_VERSION.search(user_agent)
         if version_match:
             device_info['os_version'] = version_match.group(1)
     elif 'iPhone' in user_agent or 'iPad' in user_agent or 'iPod' in user_agent:
         device_info['os'] = 'iOS'
-        version_match = re.search(r'OS\s([0-9_]+)', user_agent)
+        version_match = IOS_VERSION.search(user_agent)
         if version_match:
             device_info['os_version'] = version_match.group(1).replace('_', '.')
     elif 'Windows' in user_agent:
         device_info['os'] = 'ويندوز'
-        version_match = re.search(r'Windows NT\s([0-9\.]+)', user_agent)
+        version_match = WINDOWS_VERSION.search(user_agent)
         if version_match:
             nt_version = version_match.group(1)
             windows_versions = {
@@ -77,7 +132,7 @@ def get_client_device_info(request):
             device_info['os_version'] = windows_versions.get(nt_version, nt_version)
     elif 'Mac OS X' in user_agent:
         device_info['os'] = 'ماك'
-        version_match = re.search(r'Mac OS X\s([0-9_\.]+)', user_agent)
+        version_match = MAC_VERSION.search(user_agent)
         if version_match:
             device_info['os_version'] = version_match.group(1).replace('_', '.')
     elif 'Linux' in user_agent:
@@ -85,6 +140,13 @@ def get_client_device_info(request):
     else:
         device_info['os'] = 'نظام غير معروف'
     
+    return device_info
+
+def get_client_device_info(request):
+    user_agent = request.user_agent.string
+    # The cached dict is shared, each request gets its own copy
+    device_info = dict(parse_user_agent(user_agent))
+    
     device_info['ip_address'] = request.remote_addr
     device_info['user_agent'] = user_agent
     
@@ -113,14 +175,32 @@ def index():
 @app.route('/attendance')
 def attendance_form():
     session_code = request.args.get('session', '')
-    if session_code != attendance_data['session_code']:
+    session = get_session(session_code)
+    if session is None:
         return "Invalid or expired session"
     
-    return render_template('attendance_form.html', session_code=session_code)
+    return session['form_page'].response(request)
 
 @app.route('/attendance_confirmed')
 def attendance_confirmed():
-    return render_template('attendance_confirmed.html')
+    if attendance_data['confirmed_page'] is None:
+        attendance_data['confirmed_page'] = render_page('attendance_confirmed.html', CONFIRMED_CACHE_CONTROL)
+    return attendance_data['confirmed_page'].response(request)
+
+def json_response(payload, status_code=200):
+    response = make_response(jsonify(payload))
+    response.status_code = status_code
+    if status_code in (429, 503):
+        response.headers['Retry-After'] = str(payload.get('retry_after', 1))
+    return response
+
+class SubmittedRequest:
+    """The parts of a request the fingerprint and device checks read, kept for background processing"""
+    
+    def __init__(self, request):
+        self.user_agent = request.user_agent
+        self.remote_addr = request.remote_addr
+        self.form = request.form.copy()
 
 @app.route('/submit_attendance', methods=['POST'])
 def submit_attendance():
@@ -130,111 +210,208 @@ def submit_attendance():
         student_id = request.form.get('student_id')
         
         if not all([session_code, student_name, student_id]):
-            response = make_response(jsonify({'status': 'error', 'message': 'يجب ملء جميع الحقول'}))
-            response.status_code = 400  # Bad Request
-            return response
+            return json_response({'status': 'error', 'message': 'يجب ملء جميع الحقول'}, 400)  # Bad Request
         
-        if session_code != attendance_data['session_code']:
-            response = make_response(jsonify({'status': 'error', 'message': 'الجلسة غير صالحة أو منتهية الصلاحية'}))
-            response.status_code = 403  # Forbidden
-            return response
-        
-        # Verificar si el estudiante ya está registrado con un error de huella
-        student_key = f"{student_name}_{student_id}"
-        if student_key in attendance_data.get('fingerprint_failures', {}):
-            error_info = attendance_data['fingerprint_failures'][student_key]
-            response = make_response(jsonify({
-                'status': 'error', 
-                'message': f"تم رفض التسجيل مسبقاً بسبب: {error_info['message']}"
-            }))
-            response.status_code = 403  # Forbidden
-            return response
-        
-        # Validar primero si el estudiante existe en el sistema
-        validation_result = None
-        if attendance_data['callback_function']:
-            is_valid, message = attendance_data['callback_function'](student_name, student_id, validate_only=True)
-            validation_result = (is_valid, message)
-            
-            if not is_valid:
-                response = make_response(jsonify({'status': 'error', 'message': message}))
-                response.status_code = 404  # Not Found
-                return response
+        # Repeated taps and replayed POSTs carry the same key and get the first response again
+        key = idempotency_key(request, session_code, student_id)
+        entry, first = attendance_data['idempotency'].claim(key)
+        if not first:
+            result = IdempotencyCache.wait(entry, IDEMPOTENCY_WAIT_TIMEOUT)
+            if result is None:
+                return json_response({'status': 'error', 'message': 'الخادم مشغول، حاول مرة أخرى'}, 503)
+            return json_response(*result)
         
-        # Verificar la huella digital del dispositivo
-        fingerprint = DeviceFingerprint()
-        is_fingerprint_valid, fingerprint_message = fingerprint.verify_student(student_name, request)
+        try:
+            result = accept_submission(session_code, student_name, student_id)
+        except Exception:
+            attendance_data['idempotency'].complete(key, entry, None, keep=False)
+            raise
+        # Busy and rate-limited answers are not final, a retry with the same key runs again
+        keep = result[1] < 500 and result[1] != 429
+        attendance_data['idempotency'].complete(key, entry, result, keep)
+        return json_response(*result)
+
+def accept_submission(session_code, student_name, student_id):
+    """Rate-limit, validate and queue (or process) one submission; returns (payload, status_code)"""
+    allowed, retry_after = check_rate_limits(request, session_code, student_id)
+    if not allowed:
+        return {
+            'status': 'error',
+            'message': 'محاولات كثيرة، يرجى الانتظار قليلاً ثم المحاولة مرة أخرى',
+            'retry_after': math.ceil(retry_after)
+        }, 429  # Too Many Requests
+    
+    session = get_session(session_code)
+    if session is None:
+        return {'status': 'error', 'message': 'الجلسة غير صالحة أو منتهية الصلاحية'}, 403  # Forbidden
+    
+    # Verificar si el estudiante ya está registrado con un error de huella
+    student_key = f"{student_name}_{student_id}"
+    with session['lock']:
+        error_info = session['fingerprint_failures'].get(student_key)
+    if error_info is not None:
+        return {
+            'status': 'error', 
+            'message': f"تم رفض التسجيل مسبقاً بسبب: {error_info['message']}"
+        }, 403  # Forbidden
+    
+    # Validar primero si el estudiante existe en el sistema
+    if session['callback_function']:
+        is_valid, message = session['callback_function'](student_name, student_id, validate_only=True)
+        if not is_valid:
+            return {'status': 'error', 'message': message}, 404  # Not Found
+    
+    client = SubmittedRequest(request)
+    if SUBMISSION_MODE != "async":
+        return process_submission(session_code, student_name, student_id, client)
+    
+    # Fingerprint, device parsing and the Excel mark run in the background, the phone gets a ticket
+    ticket = attendance_data['submissions'].submit(process_submission, session_code, student_name, student_id, client)
+    if ticket is None:
+        return {'status': 'error', 'message': 'الخادم مشغول، حاول مرة أخرى'}, 503
+    return {
+        'status': 'accepted',
+        'ticket': ticket,
+        'result_url': f"/submission_result/{ticket}",
+        'retry_after': SUBMISSION_POLL_INTERVAL
+    }, 202  # Accepted
+
+def idempotency_key(request, session_code, student_id):
+    key = request.headers.get('Idempotency-Key', '')[:128]
+    if not key:
+        # Clients that send no key: an identical POST from the same address counts as a replay
+        fields = [request.remote_addr, request.user_agent.string, sorted(request.form.items(multi=True))]
+        key = hashlib.sha256(json.dumps(fields).encode()).hexdigest()
+    return (session_code, student_id, key)
+
+def client_address(request):
+    """The phone's address; behind the local tunnel, the hop it forwards. None when unknown"""
+    address = request.remote_addr
+    try:
+        local = ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return address
+    if not local:
+        return address
+    forwarded = request.headers.get('X-Forwarded-For', '')
+    return forwarded.split(',')[-1].strip() or None
+
+def check_rate_limits(request, session_code, student_id):
+    """Take a token from the client address and student buckets; returns (allowed, retry_after)"""
+    address = client_address(request)
+    if address is not None:
+        allowed, retry_after = attendance_data['address_limiter'].allow(address)
+        if not allowed:
+            return False, retry_after
+    
+    # Device data is the same for every phone of one model, so it cannot tell students apart
+    return attendance_data['student_limiter'].allow((session_code, student_id.strip()))
+
+def process_submission(session_code, student_name, student_id, client):
+    """Verify the device and mark attendance for an accepted submission; returns (payload, status_code)"""
+    session = get_session(session_code)
+    if session is None:
+        return {'status': 'error', 'message': 'الجلسة غير صالحة أو منتهية الصلاحية'}, 403
+    student_key = f"{student_name}_{student_id}"
+    
+    # Verificar la huella digital del dispositivo
+    is_fingerprint_valid, fingerprint_message = verify_fingerprint(student_name, client)
+    
+    # CAMBIO CRÍTICO: Si la huella digital no es válida, rechazar completamente
+    if not is_fingerprint_valid:
+        # Registrar el intento fallido para auditoría
+        device_info = get_client_device_info(client)
+        print(f"⚠️ Error de verificación de huella: {student_name} ({student_id}) - {fingerprint_message}")
+        print(f"  Desde dispositivo: {device_info.get('device_type', 'desconocido')} - {device_info.get('os', 'desconocido')} - IP: {device_info.get('ip_address', 'desconocido')}")
         
-        # CAMBIO CRÍTICO: Si la huella digital no es válida, rechazar completamente
-        if not is_fingerprint_valid:
-            # Registrar el intento fallido para auditoría
-            device_info = get_client_device_info(request)
-            print(f"⚠️ Error de verificación de huella: {student_name} ({student_id}) - {fingerprint_message}")
-            print(f"  Desde dispositivo: {device_info.get('device_type', 'desconocido')} - {device_info.get('os', 'desconocido')} - IP: {device_info.get('ip_address', 'desconocido')}")
-            
-            # Registrar este estudiante como fallido para evitar intentos repetidos
-            attendance_data.setdefault('fingerprint_failures', {})[student_key] = {
+        # Registrar este estudiante como fallido para evitar intentos repetidos
+        with session['lock']:
+            session['fingerprint_failures'][student_key] = {
                 'message': fingerprint_message,
                 'timestamp': datetime.now().isoformat(),
                 'device_info': device_info
             }
-            
-            # Devolver error HTTP 403 Forbidden para que el cliente lo maneje correctamente
-            response = make_response(jsonify({'status': 'error', 'message': fingerprint_message}))
-            response.status_code = 403  # Forbidden
-            return response
         
-        # Si llegamos aquí, la huella es válida, recopilamos información del dispositivo
-        device_info = get_client_device_info(request)
-        
-        student_data = {
-            'name': student_name,
-            'id': student_id,
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'device_info': {
-                'نوع الجهاز': device_info.get('device_type', 'غير معروف'),
-                'نظام التشغيل': f"{device_info.get('os', 'غير معروف')} {device_info.get('os_version', '')}",
-                'المتصفح': device_info.get('browser', 'غير معروف'),
-                'دقة الشاشة': device_info.get('screen', 'غير معروف'),
-                'اللغة': device_info.get('language', 'غير معروف'),
-                'المنطقة الزمنية': device_info.get('timezone', 'غير معروف'),
-                'عنوان IP': device_info.get('ip_address', 'غير معروف')
-            }
+        # Devolver error HTTP 403 Forbidden para que el cliente lo maneje correctamente
+        return {'status': 'error', 'message': fingerprint_message}, 403
+    
+    # Si llegamos aquí, la huella es válida, recopilamos información del dispositivo
+    device_info = get_client_device_info(client)
+    
+    student_data = {
+        'name': student_name,
+        'id': student_id,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'device_info': {
+            'نوع الجهاز': device_info.get('device_type', 'غير معروف'),
+            'نظام التشغيل': f"{device_info.get('os', 'غير معروف')} {device_info.get('os_version', '')}",
+            'المتصفح': device_info.get('browser', 'غير معروف'),
+            'دقة الشاشة': device_info.get('screen', 'غير معروف'),
+            'اللغة': device_info.get('language', 'غير معروف'),
+            'المنطقة الزمنية': device_info.get('timezone', 'غير معروف'),
+            'عنوان IP': device_info.get('ip_address', 'غير معروف')
         }
-        
-        print(f"معلومات جهاز الطالب {student_name} ({student_id}):")
-        for key, value in student_data['device_info'].items():
-            print(f"  {key}: {value}")
-        
-        # Registrar los datos del estudiante
-        attendance_data['students'].append(student_data)
-        
-        # Marcar la asistencia en Excel
-        if attendance_data['callback_function'] and validation_result and validation_result[0]:
-            result = attendance_data['callback_function'](student_name, student_id)
-            if result and isinstance(result, tuple) and len(result) >= 2 and not result[0]:
-                # Si la función de callback devuelve un error, regresar error al cliente
-                response = make_response(jsonify({'status': 'error', 'message': result[1]}))
-                response.status_code = 400
-                return response
-                
-            print(f"✅ Asistencia registrada para: {student_name} ({student_id})")
-        
-        return jsonify({'status': 'success', 'message': 'تم تسجيل حضورك بنجاح'})
+    }
+    
+    print(f"معلومات جهاز الطالب {student_name} ({student_id}):")
+    for key, value in student_data['device_info'].items():
+        print(f"  {key}: {value}")
+    
+    # Registrar los datos del estudiante
+    with session['lock']:
+        session['students'].append(student_data)
+    
+    # Marcar la asistencia en Excel
+    if session['callback_function']:
+        result = session['callback_function'](student_name, student_id)
+        if result and isinstance(result, tuple) and len(result) >= 2 and not result[0]:
+            # Si la función de callback devuelve un error, regresar error al cliente
+            return {'status': 'error', 'message': result[1]}, 400
+            
+        print(f"✅ Asistencia registrada para: {student_name} ({student_id})")
+    
+    return {'status': 'success', 'message': 'تم تسجيل حضورك بنجاح'}, 200
+
+@app.route('/submission_result/<ticket>')
+def submission_result(ticket):
+    """Answer at once with the ticket's result, or 'pending' and when to ask again"""
+    try:
+        result = attendance_data['submissions'].result(ticket)
+    except KeyError:
+        return json_response({'status': 'error', 'message': 'الطلب غير موجود أو منتهي الصلاحية'}, 404)
+    if result is None:
+        return json_response({'status': 'pending', 'ticket': ticket, 'retry_after': SUBMISSION_POLL_INTERVAL}, 202)
+    return json_response(*result)
 
 def start_server(host=None, port=5000, session_code=None, callback=None):
+    """
+    Start the server once; further lectures are added to it with add_session.
+    SERVER_MODE selects the pooled server or Flask's development server; with SUBMISSION_MODE
+    "async" submissions are answered with a ticket and processed by a SubmissionQueue.
+    """
     if host is None:
         host = get_local_ip()
     
-    attendance_data['session_code'] = session_code
-    attendance_data['callback_function'] = callback
-    attendance_data['students'] = []
-    attendance_data['fingerprint_failures'] = {}
+    if session_code is not None:
+        add_session(session_code, callback)
     
     server_url = f"http://{host}:{port}"
     attendance_url = f"{server_url}/attendance?session={session_code}"
     
-    threading.Thread(target=lambda: app.run(host=host, port=port, debug=False), daemon=True).start()
+    with attendance_data['lock']:
+        if attendance_data['submissions'] is None:
+            attendance_data['submissions'] = SubmissionQueue().start()
+        if attendance_data['confirmed_page'] is None:
+            attendance_data['confirmed_page'] = render_page('attendance_confirmed.html', CONFIRMED_CACHE_CONTROL)
+        if attendance_data['server_thread'] is None:
+            if SERVER_MODE == "pooled":
+                server = PooledWSGIServer(host, port, app)
+                target = server.serve_forever
+            else:
+                # threaded so that requests of different lectures are served side by side
+                target = lambda: app.run(host=host, port=port, debug=False, threaded=True)
+            attendance_data['server_thread'] = threading.Thread(target=target, daemon=True)
+            attendance_data['server_thread'].start()
     
     return server_url, attendance_url
 
@@ -0,0 +1,89 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+from qr_attendance.config import (SERVER_WORKERS, SERVER_QUEUE_SIZE, SERVER_BACKLOG, SERVER_TIMEOUT,
+                                  SERVER_KEEPALIVE_TIMEOUT)
+
+class PooledRequestHandler(WSGIRequestHandler):
+    """HTTP/1.1 handler that keeps connections alive only while no other client is waiting"""
+    protocol_version = "HTTP/1.1"
+    
+    def setup(self):
+        self.timeout = self.server.request_timeout
+        super().setup()
+        self.requests_handled = 0
+    
+    def handle_one_request(self):
+        if self.requests_handled:
+            # An idle kept-alive connection gives its worker back after a short wait
+            self.connection.settimeout(self.server.keepalive_timeout)
+        super().handle_one_request()
+        self.requests_handled += 1
+        if self.server.waiting:
+            self.close_connection = True
+    
+    def log_request(self, code="-", size="-"):
+        # An access line per request costs console time during a burst, only failures are logged
+        try:
+            if int(code) < 400:
+                return
+        except (TypeError, ValueError):
+            pass
+        super().log_request(code, size)
+    
+    def parse_request(self):
+        # The request line arrived, the rest of the request gets the full timeout
+        self.connection.settimeout(self.server.request_timeout)
+        return super().parse_request()
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    WSGI server for class-sized bursts: a fixed pool of worker threads, a bounded number of
+    accepted connections waiting for a worker (more get an immediate 503 instead of a timeout),
+    a listen backlog, keep-alive and socket timeouts.
+    """
+    multithread = True
+    
+    def __init__(self, host, port, app, workers=SERVER_WORKERS, queue_size=SERVER_QUEUE_SIZE,
+                 backlog=SERVER_BACKLOG, timeout=SERVER_TIMEOUT, keepalive_timeout=SERVER_KEEPALIVE_TIMEOUT):
+        self.request_queue_size = backlog
+        self.request_timeout = timeout
+        self.keepalive_timeout = keepalive_timeout
+        super().__init__(host, port, app, handler=PooledRequestHandler)
+        
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="attendance-http")
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.waiting_lock = threading.Lock()
+        # Accepted connections not yet picked up by a worker
+        self.waiting = 0
+    
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            self._reject(request)
+            return
+        with self.waiting_lock:
+            self.waiting += 1
+        self.executor.submit(self._process, request, client_address)
+    
+    def _process(self, request, client_address):
+        with self.waiting_lock:
+            self.waiting -= 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+    
+    def _reject(self, request):
+        try:
+            request.sendall(b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 1\r\n"
+                            b"Content-Length: 0\r\nConnection: close\r\n\r\n")
+        except OSError:
+            pass
+        self.shutdown_request(request)
+    
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
\ No newline at end of file
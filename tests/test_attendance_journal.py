@@ -0,0 +1,124 @@
+import os
+import io
+import shutil
+import datetime
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+import openpyxl
+from qr_attendance import attendance_journal
+from qr_attendance.attendance_journal import AttendanceJournal
+from qr_attendance.excel_handler import ExcelHandler
+from qr_attendance.config import COLUMN_NAMES, ATTENDANCE_STATUS
+
+def student_ids(events):
+    return [event["student_id"] for event in events]
+
+class AttendanceJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "attendance.xlsx.journal")
+        self.journal = AttendanceJournal(self.path)
+    
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.directory)
+    
+    def append(self, *ids):
+        self.journal.append_batch([("mark", {"student_id": student_id, "date": "2026-10-18"}) for student_id in ids])
+    
+    def test_truncate_keeps_events_after_mark(self):
+        self.append("1", "2")
+        mark = self.journal.mark()
+        self.append("3", "4")
+        self.journal.truncate(mark)
+        self.assertEqual(student_ids(self.journal.read_events()), ["3", "4"])
+        self.assertEqual(self.journal.entry_count, 2)
+        
+        # Appends after the truncate land behind the kept events, also after reopening
+        self.append("5")
+        self.journal.close()
+        self.journal = AttendanceJournal(self.path)
+        self.assertEqual(student_ids(self.journal.read_events()), ["3", "4", "5"])
+        self.assertEqual(self.journal.size, os.path.getsize(self.path))
+    
+    def test_truncate_at_end_empties_journal(self):
+        self.append("1", "2")
+        self.journal.truncate(self.journal.mark())
+        self.assertEqual(self.journal.read_events(), [])
+        self.append("3")
+        self.assertEqual(student_ids(self.journal.read_events()), ["3"])
+    
+    def test_journal_is_closed_while_swapped(self):
+        self.append("1")
+        mark = self.journal.mark()
+        self.append("2")
+        replace = os.replace
+        
+        def replace_closed(source, target):
+            # Windows refuses to replace a file that is still open
+            with self.assertRaises(OSError):
+                os.fstat(self.journal.fd)
+            replace(source, target)
+        
+        with mock.patch.object(attendance_journal.os, "replace", side_effect=replace_closed):
+            self.journal.truncate(mark)
+        self.append("3")
+        self.assertEqual(student_ids(self.journal.read_events()), ["2", "3"])
+    
+    def test_failed_swap_keeps_journaling(self):
+        self.append("1")
+        mark = self.journal.mark()
+        self.append("2")
+        with mock.patch.object(attendance_journal.os, "replace", side_effect=PermissionError("in use")):
+            with self.assertRaises(PermissionError):
+                self.journal.truncate(mark)
+        self.append("3")
+        self.assertEqual(student_ids(self.journal.read_events()), ["1", "2", "3"])
+        self.assertEqual(self.journal.entry_count, 3)
+
+class SaveWithJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "attendance.xlsx")
+        self.today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+        workbook = openpyxl.Workbook()
+        worksheet = workbook.active
+        worksheet.append([COLUMN_NAMES["student_id"], COLUMN_NAMES["full_name"], COLUMN_NAMES["date"],
+                          COLUMN_NAMES["attendance"], COLUMN_NAMES["expected_hours"], COLUMN_NAMES["actual_hours"],
+                          COLUMN_NAMES["absence_hours"]])
+        for i in range(5):
+            worksheet.append([str(444000000 + i), f"طالب {i}", self.today, '', '2', '', ''])
+        workbook.save(self.path)
+        
+        self.handler = ExcelHandler(self.path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.handler.load_file()
+            self.handler.convert_date_column()
+            self.handler.open_journal(checkpoint_interval=0)
+    
+    def tearDown(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.handler.close_save_service()
+            self.handler.close_journal()
+        shutil.rmtree(self.directory)
+    
+    def test_failed_journal_truncate_keeps_formatted_save(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.handler.mark_attendance("طالب 1", "444000001", self.today)
+            with mock.patch.object(self.handler.journal, "truncate", side_effect=PermissionError("in use")):
+                success, message = self.handler.save_file()
+        self.assertTrue(success, message)
+        self.assertNotIn("fallback", message)
+        
+        worksheet = openpyxl.load_workbook(self.path).active
+        attendance = worksheet.cell(row=3, column=4)
+        self.assertEqual(attendance.value, ATTENDANCE_STATUS["present"])
+        self.assertEqual(attendance.number_format, '@')
+        self.assertIsInstance(worksheet.cell(row=3, column=3).value, datetime.datetime)
+        # The mark stays journaled and is replayed onto the saved file after a crash
+        self.assertEqual(student_ids(self.handler.journal.read_events()), ["444000001"])
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,123 @@
+import os
+import io
+import shutil
+import sqlite3
+import datetime
+import tempfile
+import unittest
+import contextlib
+import openpyxl
+from qr_attendance.attendance_store import AttendanceStore
+from qr_attendance.excel_handler import ExcelHandler
+from qr_attendance.config import COLUMN_NAMES
+
+# Key of each earlier schema, and the rows a migration of it keeps
+OLD_SCHEMAS = {
+    "row position": ("PRIMARY KEY (source, row)", [("2026-10-01", "101", 0, "حاضر"), ("2026-10-01", "101", 1, "غائب"),
+                                                   ("2026-10-02", "", 0, "غائب")]),
+    # This key had already merged the two periods into the last one saved
+    "student, section and date": ("PRIMARY KEY (student_id, section, lecture_date)",
+                                  [("2026-10-01", "101", 0, "غائب"), ("2026-10-02", "", 0, "غائب")]),
+}
+
+class AttendanceStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.directory, "history.db")
+        self.day = datetime.datetime(2026, 10, 18)
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def write_export(self, name):
+        """Two students with a double period on one day and a single period the next"""
+        path = os.path.join(self.directory, name)
+        workbook = openpyxl.Workbook()
+        worksheet = workbook.active
+        worksheet.append([COLUMN_NAMES["student_id"], COLUMN_NAMES["full_name"], COLUMN_NAMES["section"],
+                          COLUMN_NAMES["date"], COLUMN_NAMES["attendance"], COLUMN_NAMES["expected_hours"],
+                          COLUMN_NAMES["actual_hours"], COLUMN_NAMES["absence_hours"]])
+        for day, periods in ((self.day, 2), (self.day + datetime.timedelta(days=1), 1)):
+            for student_id in ("444000001", "444000002"):
+                for _ in range(periods):
+                    worksheet.append([student_id, f"طالب {student_id[-1]}", "30001", day, '', '2', '', ''])
+        workbook.save(path)
+        return path
+    
+    def save_absent(self, store, path):
+        handler = ExcelHandler(path, attendance_store=store)
+        with contextlib.redirect_stdout(io.StringIO()):
+            handler.load_file()
+            handler.convert_date_column()
+            handler.mark_all_absent(self.day)
+            success, message = handler.save_file()
+        self.assertTrue(success, message)
+    
+    def test_double_period_is_kept_and_daily_exports_are_not_repeated(self):
+        store = AttendanceStore(self.db_path)
+        try:
+            for name in ("Attendance_1.xlsx", "Attendance_2.xlsx", "Attendance_3.xlsx"):
+                self.save_absent(store, self.write_export(name))
+            
+            self.assertEqual(store._query("SELECT COUNT(*) FROM attendance", [])[0][0], 6)
+            self.assertEqual(store.absence_hours("444000001"), 4)
+            history = store.student_history("444000001")
+            self.assertEqual([row[0] for row in history], ["2026-10-18", "2026-10-18", "2026-10-19"])
+        finally:
+            store.close()
+    
+    def test_incremental_save_keeps_periods(self):
+        store = AttendanceStore(self.db_path)
+        try:
+            path = self.write_export("Attendance_1.xlsx")
+            handler = ExcelHandler(path, attendance_store=store)
+            with contextlib.redirect_stdout(io.StringIO()):
+                handler.load_file()
+                handler.convert_date_column()
+                handler.save_file()
+                # Only the changed second period of the first student is written now
+                handler.mark_attendance("طالب 1", "444000001", self.day)
+                handler.save_file()
+            
+            rows = store._query("SELECT period, status FROM attendance WHERE student_id = ? AND lecture_date = ? "
+                                "ORDER BY period", ["444000001", "2026-10-18"])
+            self.assertEqual([period for period, _ in rows], [0, 1])
+            self.assertEqual(len({status for _, status in rows}), 1)
+        finally:
+            store.close()
+    
+    def test_migrates_older_schemas(self):
+        rows = [
+            ("a.xlsx", 1, "7", "2026-10-01", "101", "غائب", 2),
+            ("a.xlsx", 2, "7", "2026-10-01", "101", "غائب", 2),
+            ("b.xlsx", 1, "7", "2026-10-01", "101", "حاضر", 0),
+            ("b.xlsx", 2, "7", "2026-10-01", "101", "غائب", 2),
+            ("b.xlsx", 3, "7", "2026-10-02", None, "غائب", 2),
+            ("b.xlsx", 4, "7", None, "101", "", 0),
+        ]
+        for schema, (key, expected) in OLD_SCHEMAS.items():
+            with self.subTest(schema):
+                db_path = os.path.join(self.directory, f"{len(key)}.db")
+                connection = sqlite3.connect(db_path)
+                connection.execute(f"CREATE TABLE attendance (source TEXT NOT NULL, row INTEGER NOT NULL, student_id TEXT NOT NULL, "
+                                   f"student_name TEXT, lecture_date TEXT, semester TEXT, section TEXT, status TEXT, "
+                                   f"expected_hours REAL, actual_hours REAL, absence_hours REAL, authorized_absence TEXT, {key})")
+                connection.executemany(f"INSERT OR REPLACE INTO attendance (source, row, student_id, lecture_date, section, status, "
+                                       f"absence_hours) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                connection.commit()
+                connection.close()
+                
+                with contextlib.redirect_stdout(io.StringIO()):
+                    store = AttendanceStore(db_path)
+                    store.close()
+                    # Reopening a migrated database leaves it as it is
+                    store = AttendanceStore(db_path)
+                try:
+                    migrated = store._query("SELECT lecture_date, section, period, status FROM attendance "
+                                            "ORDER BY lecture_date, period", [])
+                    self.assertEqual(migrated, expected)
+                finally:
+                    store.close()
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,157 @@
+import random
+import difflib
+import unittest
+from qr_attendance.name_similarity import NameForm, NameSimilarity, normalize_name
+from qr_attendance.name_index import NameIndex
+
+THRESHOLD = 0.8
+
+FIRST_NAMES = ['محمد', 'أحمد', 'عبدالله', 'عبد الله', 'سعد', 'خالد', 'فهد', 'علي', 'عمر', 'يوسف', 'إبراهيم', 'ابراهيم']
+FAMILY_NAMES = ['العتيبي', 'القحطاني', 'الغامدي', 'الزهراني', 'الشهري', 'الدوسري', 'المطيري', 'الحربي']
+LATIN_NAMES = ['Mohammed', 'Ahmed', 'Abdullah', 'Saad', 'Khalid', 'Fahad', 'Ali', 'Omar', 'AL-OTAIBI', 'al otaibi']
+
+def reference_score(query, name):
+    """The difflib comparison the name check used before the similarity engine"""
+    return difflib.SequenceMatcher(None, normalize_name(query).lower(), normalize_name(name).lower()).ratio()
+
+def reference_best_match(query, names):
+    """The full scan _find_best_name_match did over today's rows"""
+    best_score = 0
+    best_match = None
+    for name in names:
+        similarity = reference_score(query, name)
+        if similarity > best_score and similarity >= THRESHOLD:
+            best_score = similarity
+            best_match = normalize_name(name)
+    return best_match, best_score
+
+class NameGenerator:
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+    
+    def name(self):
+        pool = LATIN_NAMES if self.random.random() < 0.2 else FIRST_NAMES
+        parts = [self.random.choice(pool) for _ in range(self.random.randint(1, 3))]
+        if pool is FIRST_NAMES and self.random.random() < 0.8:
+            parts.append(self.random.choice(FAMILY_NAMES))
+        return ' '.join(parts)
+    
+    def spaced(self, name):
+        """Extra, leading, trailing and non-ASCII whitespace, as typed on a phone"""
+        separators = [' ', '  ', '\t', '\u00a0', ' \n ']
+        words = name.split()
+        text = ''.join(word + self.random.choice(separators) for word in words)
+        return self.random.choice(['', ' ', '\t']) + text
+    
+    def typo(self, name):
+        """Drop, duplicate, swap or replace one character"""
+        if not name:
+            return name
+        i = self.random.randrange(len(name))
+        edit = self.random.randrange(4)
+        if edit == 0:
+            return name[:i] + name[i + 1:]
+        if edit == 1:
+            return name[:i] + name[i] + name[i:]
+        if edit == 2 and i + 1 < len(name):
+            return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+        return name[:i] + self.random.choice('ابتثجحخدذرزسشصضطظعغفقكلمنهويةىءأإآ ab') + name[i + 1:]
+    
+    def query(self, roster):
+        """A submitted name: usually a roster name with noise, sometimes someone else"""
+        choice = self.random.random()
+        if choice < 0.15 or not roster:
+            return self.name()
+        name = self.random.choice(roster)
+        if choice < 0.35:
+            return self.spaced(name)
+        if choice < 0.5:
+            return name.upper() if self.random.random() < 0.5 else name.lower()
+        query = name
+        for _ in range(self.random.randint(1, 3)):
+            query = self.typo(query)
+        return self.spaced(query) if self.random.random() < 0.3 else query
+    
+    def roster(self, size):
+        return [self.spaced(self.name()) if self.random.random() < 0.1 else self.name() for _ in range(size)]
+
+class NameSimilarityTest(unittest.TestCase):
+    def test_score_matches_difflib(self):
+        generator = NameGenerator(9)
+        similarity = NameSimilarity(THRESHOLD)
+        accepted = 0
+        for _ in range(20000):
+            roster = [generator.name() for _ in range(3)]
+            name = generator.random.choice(roster)
+            query = generator.query(roster)
+            expected = reference_score(query, name)
+            got = similarity.score(NameForm(query), NameForm(name))
+            
+            self.assertEqual(got is not None, expected >= THRESHOLD, (query, name, expected, got))
+            if got is not None:
+                self.assertEqual(got, expected, (query, name))
+                accepted += 1
+        # Both sides of the threshold must be exercised
+        self.assertGreater(accepted, 2000)
+        self.assertLess(accepted, 18000)
+    
+    def test_cached_matcher_is_reused_safely(self):
+        similarity = NameSimilarity(THRESHOLD)
+        roster_form = NameForm('عبدالله  العتيبي')
+        for query in ['عبدالله العتيبي', 'عبداله العتيبي', 'عبدالله العتيبى', 'عبدالرحمن الحربي', 'عبدالله العتيبي'] * 3:
+            expected = reference_score(query, 'عبدالله  العتيبي')
+            got = similarity.score(NameForm(query), roster_form)
+            self.assertEqual(got, expected if expected >= THRESHOLD else None, query)
+    
+    def test_whitespace_and_case_only_differences_are_identical(self):
+        similarity = NameSimilarity(THRESHOLD)
+        self.assertEqual(similarity.score(NameForm(' محمد\t\u00a0 العتيبي \n'), NameForm('محمد العتيبي')), 1.0)
+        self.assertEqual(similarity.score(NameForm('MOHAMMED  Ali'), NameForm('mohammed ali')), 1.0)
+    
+    def test_empty_names(self):
+        similarity = NameSimilarity(THRESHOLD)
+        self.assertEqual(similarity.score(NameForm(''), NameForm('   ')), 1.0)
+        self.assertIsNone(similarity.score(NameForm(''), NameForm('علي')))
+
+class NameIndexTest(unittest.TestCase):
+    def test_best_match_matches_full_scan(self):
+        generator = NameGenerator(8)
+        for size in [0, 1, 2, 5, 30, 200]:
+            for _ in range(40 if size < 200 else 10):
+                roster = generator.roster(size)
+                index = NameIndex(roster, threshold=THRESHOLD)
+                for _ in range(25):
+                    query = generator.query(roster)
+                    self.assertEqual(index.best_match(query), reference_best_match(query, roster), (query, size))
+    
+    def test_candidates_keep_every_match(self):
+        generator = NameGenerator(3)
+        roster = generator.roster(300)
+        index = NameIndex(roster, threshold=THRESHOLD)
+        for _ in range(300):
+            query = generator.query(roster)
+            candidates = set(index.candidates(NameForm(query).key))
+            for row, name in enumerate(roster):
+                if reference_score(query, name) >= THRESHOLD:
+                    self.assertIn(row, candidates, (query, name))
+    
+    def test_duplicate_names_keep_first_in_roster_order(self):
+        roster = ['سعد الحربي', 'سعد  الحربي', 'سعد الحربى']
+        index = NameIndex(roster, threshold=THRESHOLD)
+        self.assertEqual(index.best_match('سعد الحربي'), reference_best_match('سعد الحربي', roster))
+    
+    def test_match_position_matches_difflib(self):
+        generator = NameGenerator(4)
+        roster = generator.roster(50)
+        positions = [10 * row + 7 for row in range(len(roster))]
+        index = NameIndex(roster, positions=positions, threshold=THRESHOLD)
+        for _ in range(500):
+            row = generator.random.randrange(len(roster))
+            query = generator.query([roster[row]])
+            name, similarity = index.match_position(positions[row], query)
+            expected = reference_score(query, roster[row])
+            self.assertEqual(name, normalize_name(roster[row]))
+            self.assertEqual(similarity, expected if expected >= THRESHOLD else None, query)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file